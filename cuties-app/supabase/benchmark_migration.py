@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Cuties App Migration Benchmarks
+Micro-benchmarks and a scaling harness for the hot paths in migrate_data.py
+
+Usage:
+    python benchmark_migration.py dates
+    python benchmark_migration.py run --scales 1 10 100 [--stream] [--json out.json]
+    python benchmark_migration.py generate DIR --scale 10
+    python benchmark_migration.py rest --scale 1 [--throttle 0.02] [--reject 0.001]
+    python benchmark_migration.py resume --scale 2 --jobs 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from collections import Counter
+from contextlib import redirect_stdout
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import migrate_data
+
+# Rows per table in a 1x synthetic export
+BASE_ROWS = {
+    "users": 500,
+    "messages": 5000,
+    "likes": 3000,
+    "friend_testimonials": 300,
+    "app_testimonials": 100,
+    "met_ups": 1000,
+    "projects": 200,
+    "user_links": 600,
+    "videos": 150,
+    "pairings": 100,
+}
+
+# Header of each synthetic export, matching the columns migrate_data reads
+EXPORT_HEADERS = {
+    "users": ["unique id", "email", "Name", "Additional Links", "Age", "shortdescription",
+              "Background Color", "consent", "Collabs", "Communities", "Creation Date", "Modified Date"],
+    "messages": ["unique id", "Creator", "Recipient", "Value", "Creation Date", "Modified Date"],
+    "likes": ["unique id", "Sender", "Receiver", "Creation Date", "Modified Date"],
+    "friend_testimonials": ["unique id", "Creator", "Subject", "Value", "Creation Date", "Modified Date"],
+    "app_testimonials": ["unique id", "Creator", "Username", "Value", "Creation Date", "Modified Date"],
+    "met_ups": ["unique id", "Creator", "User 2", "Creation Date", "Modified Date"],
+    "projects": ["unique id", "Name", "Description", "Link", "Photo", "Order", "Creation Date",
+                 "Modified Date"],
+    "user_links": ["unique id", "User", "Label", "Link", "Creation Date", "Modified Date"],
+    "videos": ["unique id", "Creator", "URL", "Creation Date", "Modified Date"],
+    "pairings": ["unique id", "Match 1 ", "Match 2", "Match 2 Alt name", "Contact Info2", "Description",
+                 "Here for", "Anonymous"],
+}
+
+WORDS = ("hey", "coffee", "sometime", "lol", "are", "you", "going", "to", "the", "party",
+         "tonight", "omg", "yes", "love", "that", "idea", "see", "u", "there", "haha")
+
+# Statuses the PostgREST stand-in answers with, in report order
+STAND_IN_STATUSES = (201, 400, 413, 429, 503)
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def legacy_parse_date(date_str: str) -> Optional[datetime]:
+    """The strptime-based parse_date that shipped before the fast parser."""
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str, "%b %d, %Y %I:%M %p")
+    except ValueError:
+        try:
+            return datetime.strptime(date_str, "%b %d, %Y %I:%M %p")
+        except ValueError:
+            return None
+
+
+def random_bubble_date(rng: random.Random) -> str:
+    return (f"{rng.choice(MONTHS)} {rng.randint(1, 28)}, {rng.randint(2021, 2025)} "
+            f"{rng.randint(1, 12)}:{rng.randint(0, 59):02d} {rng.choice(['am', 'pm'])}")
+
+
+def sample_bubble_dates(count: int, distinct: int, seed: int = 0) -> list[str]:
+    """Generate Bubble-style timestamps drawn from `distinct` minute values."""
+    rng = random.Random(seed)
+    pool = [random_bubble_date(rng) for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def bench_dates(count: int, repeat: int):
+    """Compare parse_date against the legacy strptime implementation."""
+    print(f"Parsing {count} timestamps, best of {repeat}")
+    print(f"{'workload':<28}{'legacy (s)':>12}{'fast (s)':>12}{'speedup':>10}")
+
+    for distinct in (5000, count):
+        label = f"pool of {distinct:,} values"
+        values = sample_bubble_dates(count, distinct)
+        assert [migrate_data.parse_date(v) for v in values] == [legacy_parse_date(v) for v in values]
+
+        def run_fast():
+            migrate_data._parse_bubble_date.cache_clear()
+            for v in values:
+                migrate_data.parse_date(v)
+
+        legacy = min(timeit.repeat(lambda: [legacy_parse_date(v) for v in values], number=1, repeat=repeat))
+        fast = min(timeit.repeat(run_fast, number=1, repeat=repeat))
+        print(f"{label:<28}{legacy:>12.3f}{fast:>12.3f}{legacy / fast:>9.1f}x")
+
+
+def generate_export(directory: Path, scale: float = 1, seed: int = 0) -> dict[str, int]:
+    """Write a synthetic Bubble export for every CSV_FILES table.
+
+    Activity follows a Zipf-like distribution over usernames (a few users
+    send most messages and likes) and message lengths are log-normal, with
+    commas, quotes and embedded newlines so the CSV parser does real work.
+    Returns the number of rows written per table.
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    counts = {name: max(1, int(rows * scale)) for name, rows in BASE_ROWS.items()}
+
+    names = [f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}" for i in range(counts["users"])]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(names))]
+    cum_weights = [0.0] * len(weights)
+    total = 0.0
+    for i, weight in enumerate(weights):
+        total += weight
+        cum_weights[i] = total
+    # A small share of references are the admin placeholder or unknown names
+    pick = lambda: (rng.choices(names, cum_weights=cum_weights)[0] if rng.random() > 0.02
+                    else rng.choice(["(App admin)", f"ghost {rng.randint(0, 50)}"]))
+
+    def text(mean_words: float) -> str:
+        words = [rng.choice(WORDS) for _ in range(max(1, int(rng.lognormvariate(0, 1) * mean_words)))]
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), 'said "hi",')
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), "\n")
+        return " ".join(words)
+
+    row_makers = {
+        "users": lambda i: [f"u{i}", f"user{i}@example.com", names[i], f"bub{i}", str(rng.randint(18, 60)),
+                            text(8), rng.choice(["#ffe4e1", "#e0ffff", ""]), rng.choice(["yes", "no"]),
+                            ", ".join(rng.sample(names, 2)), "sf, nyc",
+                            random_bubble_date(rng), random_bubble_date(rng)],
+        "messages": lambda i: [f"m{i}", pick(), pick(), text(12) if rng.random() > 0.01 else "",
+                               random_bubble_date(rng), random_bubble_date(rng)],
+        "likes": lambda i: [f"l{i}", pick(), pick(), random_bubble_date(rng), random_bubble_date(rng)],
+        "friend_testimonials": lambda i: [f"f{i}", pick(), pick(), text(30),
+                                          random_bubble_date(rng), random_bubble_date(rng)],
+        "app_testimonials": lambda i: [f"a{i}", pick(), rng.choice(names), text(20),
+                                       random_bubble_date(rng), random_bubble_date(rng)],
+        "met_ups": lambda i: [f"mu{i}", pick(), pick(), random_bubble_date(rng), random_bubble_date(rng)],
+        "projects": lambda i: [f"p{i}", text(2), text(15), f"https://example.com/p/{i}", "",
+                               str(rng.randint(1, 5)), random_bubble_date(rng), random_bubble_date(rng)],
+        "user_links": lambda i: [f"ul{i}", pick(), rng.choice(["Instagram", "Twitter", ""]),
+                                 f"https://example.com/{i}", random_bubble_date(rng), random_bubble_date(rng)],
+        "videos": lambda i: [f"v{i}", pick(),
+                             f'<iframe src="https://www.youtube.com/embed/vid{i}?rel=0"></iframe>',
+                             random_bubble_date(rng), random_bubble_date(rng)],
+        "pairings": lambda i: [f"pr{i}", pick(), pick().upper(), rng.choice(names), "@handle", text(10),
+                               "love, friends", rng.choice(["yes", "no"])],
+    }
+
+    for name, filename in migrate_data.CSV_FILES.items():
+        with open(directory / filename, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_HEADERS[name])
+            make_row = row_makers[name]
+            for i in range(counts[name]):
+                writer.writerow(make_row(i))
+    return counts
+
+
+def bench_migration(scales: list[float], stream: bool, track_memory: bool) -> list[dict]:
+    """Run every migration step against an encoding memory sink at each scale."""
+    results = []
+    original_dir = migrate_data.EXPORT_DIR
+    print(f"{'scale':>6} {'stage':<22}{'rows':>10}{'MiB out':>9}{'seconds':>9}{'rows/s':>11}{'peak MiB':>10}")
+    try:
+        for scale in scales:
+            with tempfile.TemporaryDirectory() as tmp:
+                generate_export(Path(tmp), scale)
+                migrate_data.EXPORT_DIR = Path(tmp)
+                migrate_data._parse_bubble_date.cache_clear()
+                migrator = migrate_data.DataMigrator(stream=stream, sink="memory")
+                migrator.sink = sink = migrate_data.MemorySink(encode=True)
+
+                for step in migrate_data.MIGRATION_STEPS:
+                    rows_before, bytes_before = sum(sink.counts.values()), sink.bytes_written
+                    if track_memory:
+                        tracemalloc.start()
+                    started = time.perf_counter()
+                    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                        migrator._run_step(step)
+                    elapsed = time.perf_counter() - started
+                    peak = tracemalloc.get_traced_memory()[1] if track_memory else 0
+                    if track_memory:
+                        tracemalloc.stop()
+
+                    rows = sum(sink.counts.values()) - rows_before
+                    if step == "username_map":
+                        rows = len(migrator.user_map)
+                    result = {
+                        "scale": scale,
+                        "stage": step,
+                        "rows": rows,
+                        "bytes": sink.bytes_written - bytes_before,
+                        "seconds": round(elapsed, 4),
+                        "rows_per_sec": round(rows / elapsed) if elapsed else 0,
+                        "peak_bytes": peak,
+                    }
+                    results.append(result)
+                    print(f"{scale:>6g} {step:<22}{rows:>10}{result['bytes'] / 2**20:>9.1f}"
+                          f"{elapsed:>9.3f}{result['rows_per_sec']:>11}{peak / 2**20:>10.1f}")
+    finally:
+        migrate_data.EXPORT_DIR = original_dir
+    return results
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        table = self.path.split("?")[0].rsplit("/", 1)[-1]
+        time.sleep(server.latency)
+        with server.lock:
+            draw = server.rng.random()
+        error = None
+        if len(body) > server.max_body:
+            status = 413
+        elif draw < server.throttle:
+            status = 429
+        elif draw < server.throttle + server.flaky:
+            status = 503
+        else:
+            ids = [row["id"] for row in json.loads(body)]
+            if any(server.rejects(row_id) for row_id in ids):
+                status = 400
+                error = {"code": "23514", "message": "new row violates check constraint (stand-in)"}
+            else:
+                status = 201
+                with server.lock:
+                    server.stored.setdefault(table, set()).update(ids)
+        with server.lock:
+            server.statuses[table, status] += 1
+
+        data = json.dumps(error).encode("utf-8") if error else b""
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PostgrestStandIn(ThreadingHTTPServer):
+    """Local stand-in for the PostgREST insert endpoint RestUploader posts to.
+
+    Bodies over `max_body` bytes get 413. Otherwise a `throttle` share of
+    requests get 429 and a `flaky` share 503; a batch holding one of the
+    `reject` share of ids gets 400 with a constraint error code, as
+    PostgREST reports a failed CHECK. Anything else is stored and gets
+    201. Every response waits `latency` seconds first.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, max_body: int, throttle: float, flaky: float, reject: float,
+                 latency: float, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.max_body = max_body
+        self.throttle = throttle
+        self.flaky = flaky
+        self.reject = reject
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.statuses: Counter = Counter()  # (table, status) -> responses
+        self.stored: dict[str, set[str]] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def rejects(self, row_id: str) -> bool:
+        return int(row_id[:8], 16) / 0xFFFFFFFF < self.reject
+
+
+def bench_rest(scale: float, concurrency: int, max_body: int, throttle: float, flaky: float,
+               reject: float, latency: float) -> list[dict]:
+    """Upload a synthetic export with RestUploader to a local PostgREST stand-in.
+
+    The export is migrated into a memory sink first, so only the REST
+    upload is timed. Checks that every row was either accepted or
+    rejected, and that the stand-in stored exactly the accepted ones.
+    """
+    original_dir = migrate_data.EXPORT_DIR
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            generate_export(Path(tmp), scale)
+            migrate_data.EXPORT_DIR = Path(tmp)
+            migrator = migrate_data.DataMigrator(stream=True, sink="memory")
+            migrator.sink = sink = migrate_data.MemorySink(keep=True)
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                for step in migrate_data.MIGRATION_STEPS:
+                    migrator._run_step(step)
+    finally:
+        migrate_data.EXPORT_DIR = original_dir
+
+    server = PostgrestStandIn(max_body, throttle, flaky, reject, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    uploader = migrate_data.RestUploader(server.url, "stand-in", concurrency=concurrency)
+    results = []
+    print(f"{'table':<22}{'rows':>8}{'inserted':>10}{'rejected':>10}"
+          + "".join(f"{status:>7}" for status in STAND_IN_STATUSES) + f"{'seconds':>9}{'rows/s':>9}")
+    try:
+        for table, rows in sink.rows.items():
+            rejected = []
+            started = time.perf_counter()
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                inserted = uploader.insert(table, rows, on_reject=lambda record, reason: rejected.append(record))
+            elapsed = time.perf_counter() - started
+            result = {
+                "table": table,
+                "rows": len(rows),
+                "inserted": inserted,
+                "rejected": len(rejected),
+                "responses": {status: server.statuses[table, status] for status in STAND_IN_STATUSES},
+                "seconds": round(elapsed, 4),
+                "rows_per_sec": round(len(rows) / elapsed) if elapsed else 0,
+            }
+            results.append(result)
+            print(f"{table:<22}{len(rows):>8}{inserted:>10}{len(rejected):>10}"
+                  + "".join(f"{count:>7}" for count in result["responses"].values())
+                  + f"{elapsed:>9.3f}{result['rows_per_sec']:>9}")
+            stored = len(server.stored.get(table, ()))
+            if inserted + len(rejected) != len(rows) or stored != inserted:
+                print(f"  {table}: {len(rows)} rows, {inserted} inserted, {len(rejected)} rejected, "
+                      f"{stored} stored by the stand-in")
+    finally:
+        uploader.close()
+        server.shutdown()
+        server.server_close()
+    print(f"{uploader.bytes_sent / 2**20:.1f} MiB accepted, {uploader.failed_batches} batches failed")
+    return results
+
+
+def check_resume(scale: float, jobs: int, crash_after: int) -> bool:
+    """Interrupt a file-sink migration inside messages, resume it and compare the output.
+
+    The run is cut off right after its `crash_after`th messages batch is
+    written, before the checkpoint records it. Every COPY file of the
+    resumed run must hold the same lines as an uninterrupted run's, so no
+    row is lost or written twice. Returns whether they all match.
+    """
+    original_dir, original_write = migrate_data.EXPORT_DIR, migrate_data.FileSink._write
+    writes = Counter()
+
+    def interrupted_write(sink, key, *args):
+        written = original_write(sink, key, *args)
+        writes[key] += 1
+        if key == "messages" and writes[key] == crash_after:
+            raise OSError("interrupted by benchmark_migration.py resume")
+        return written
+
+    def migrate(tmp: Path, output: str, resume: bool = False):
+        migrator = migrate_data.DataMigrator(use_supabase=False, stream=True, sink="file",
+                                             sink_path=tmp / output)
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            migrator.run_migration(jobs=jobs, checkpoint_path=tmp / f"{output}.json", resume=resume,
+                                   dead_letter_path=tmp / f"{output}.dead.jsonl")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            generate_export(tmp / "export", scale)
+            migrate_data.EXPORT_DIR = tmp / "export"
+            migrate(tmp, "clean")
+            migrate_data.FileSink._write = interrupted_write
+            try:
+                migrate(tmp, "resumed")
+            except OSError:
+                pass
+            else:
+                print(f"messages took fewer than {crash_after} batches; raise --scale")
+                return False
+            finally:
+                migrate_data.FileSink._write = original_write
+            migrate(tmp, "resumed", resume=True)
+
+            matched = True
+            print(f"{'file':<26}{'clean':>10}{'resumed':>10}")
+            for path in sorted((tmp / "clean").glob("*.copy")):
+                clean = sorted(path.read_text(encoding="utf-8").splitlines())
+                resumed_path = tmp / "resumed" / path.name
+                resumed = (sorted(resumed_path.read_text(encoding="utf-8").splitlines())
+                           if resumed_path.exists() else [])
+                matched &= clean == resumed
+                print(f"{path.name:<26}{len(clean):>10}{len(resumed):>10}"
+                      + ("" if clean == resumed else "  MISMATCH"))
+    finally:
+        migrate_data.EXPORT_DIR = original_dir
+    print(f"Resumed output {'matches' if matched else 'differs from'} an uninterrupted run ({jobs} jobs)")
+    return matched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Cuties migration hot paths")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    dates = subparsers.add_parser("dates", help="Benchmark Bubble timestamp parsing")
+    dates.add_argument("--count", type=int, default=200_000, help="Timestamps per run")
+    dates.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+
+    run = subparsers.add_parser("run", help="Run every migration stage on synthetic exports")
+    run.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                     help="Export sizes relative to the 1x baseline")
+    run.add_argument("--stream", action="store_true", help="Use the streaming pipeline")
+    run.add_argument("--no-memory", action="store_true",
+                     help="Skip tracemalloc peak tracking (it slows the run down)")
+    run.add_argument("--json", type=Path, help="Write results as JSON for cross-commit comparison")
+
+    generate = subparsers.add_parser("generate", help="Write a synthetic export to a directory")
+    generate.add_argument("directory", type=Path)
+    generate.add_argument("--scale", type=float, default=1)
+    generate.add_argument("--seed", type=int, default=0)
+
+    rest = subparsers.add_parser("rest", help="Upload a synthetic export to a local PostgREST stand-in")
+    rest.add_argument("--scale", type=float, default=1)
+    rest.add_argument("--concurrency", type=int, default=migrate_data.REST_CONCURRENCY,
+                      help="Requests in flight")
+    rest.add_argument("--max-body", type=int, default=256 << 10,
+                      help="Largest body in bytes the stand-in accepts before answering 413")
+    rest.add_argument("--throttle", type=float, default=0.02, help="Share of requests answered 429")
+    rest.add_argument("--flaky", type=float, default=0.01, help="Share of requests answered 503")
+    rest.add_argument("--reject", type=float, default=0.001,
+                      help="Share of rows failing a constraint (400 for their batch)")
+    rest.add_argument("--latency", type=float, default=0.01, help="Seconds the stand-in takes per request")
+    rest.add_argument("--json", type=Path, help="Write results as JSON for cross-commit comparison")
+
+    resume = subparsers.add_parser("resume", help="Check that an interrupted file-sink run resumes cleanly")
+    resume.add_argument("--scale", type=float, default=2)
+    resume.add_argument("--jobs", type=int, default=4, help="Migration steps run in parallel")
+    resume.add_argument("--crash-after", type=int, default=3,
+                        help="Interrupt the run after this many messages batches")
+
+    args = parser.parse_args()
+
+    if args.command == "dates":
+        bench_dates(args.count, args.repeat)
+    elif args.command == "run":
+        results = bench_migration(args.scales, args.stream, not args.no_memory)
+        if args.json:
+            args.json.write_text(json.dumps(results, indent=2))
+            print(f"Results written to: {args.json}")
+    elif args.command == "rest":
+        if not migrate_data.HAS_HTTPX:
+            parser.error("rest needs httpx: pip install httpx")
+        results = bench_rest(args.scale, args.concurrency, args.max_body, args.throttle, args.flaky,
+                             args.reject, args.latency)
+        if args.json:
+            args.json.write_text(json.dumps(results, indent=2))
+            print(f"Results written to: {args.json}")
+    elif args.command == "resume":
+        if not check_resume(args.scale, args.jobs, args.crash_after):
+            raise SystemExit(1)
+    elif args.command == "generate":
+        counts = generate_export(args.directory, args.scale, args.seed)
+        print(f"Wrote {sum(counts.values())} rows to {args.directory}")
@@ -10,313 +10,2914 @@ Usage:
 Or use with direct database connection:
     Set DATABASE_URL environment variable
     Run: python migrate_data.py --direct
+
+Add --stream to process very large exports with bounded memory, and
+--resume to continue an interrupted run from its checkpoint manifest.
+--sink picks another destination (local files, SQLite, memory) and
+--dry-run transforms and validates everything without a database.
+With --direct, --fast-load stages rows in unlogged tables and merges them
+with indexes rebuilt in one transaction at the end, --push-down loads
+the raw exports and runs the transforms as SQL inside the database, and
+--partitions loads each large export over several connections at once.
+--sync picks up the newest exports and writes only what changed since
+the last sync, and --pipeline writes each table's batches while the next
+ones are still being transformed. --verify compares the database with
+the exports using per-bucket row hashes. Names are matched to users
+ignoring case, spacing and unicode form, through --name-aliases and,
+failing those, by trigram similarity.
+
+The newest export of each table in EXPORT_DIR is used, found by its
+export_All-<Type>_ name prefix; .csv.gz and .csv.zst (with zstandard
+installed) archives are read without unpacking them first.
+"""
+
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
+import queue
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from itertools import chain, islice, tee
+from operator import itemgetter
+from typing import Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import argparse
+
+# Try to import supabase client
+try:
+    from supabase import create_client, Client
+    HAS_SUPABASE = True
+except ImportError:
+    HAS_SUPABASE = False
+
+# httpx ships with supabase-py and powers the concurrent REST uploader
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+# Try to import psycopg2 for direct connection
+try:
+    import psycopg2
+    from psycopg2.extras import execute_values
+    from psycopg2.pool import ThreadedConnectionPool
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+# zstandard reads .csv.zst exports (gzip is in the standard library)
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+
+EXPORT_DIR = Path(__file__).parent.parent / "bubble-exports"
+
+# CSV file mapping
+CSV_FILES = {
+    "users": "export_All-Users_2026-01-21_02-10-40.csv",
+    "messages": "export_All-Messages_2026-01-21_02-10-58.csv",
+    "likes": "export_All-Likes_2026-01-21_02-12-18.csv",
+    "friend_testimonials": "export_All-FriendTestimonials_2026-01-21_02-12-03.csv",
+    "app_testimonials": "export_All-AppTestimonials_2026-01-21_02-15-32.csv",
+    "met_ups": "export_All-Met-Ups_2026-01-21_02-11-44.csv",
+    "projects": "export_All-Projects_2026-01-21_02-12-51.csv",
+    "user_links": "export_All-UserLinks_2026-01-21_02-13-02.csv",
+    "videos": "export_All-Videos_2026-01-21_02-13-13.csv",
+    "pairings": "export_All-Pairings_2026-01-21_02-12-42.csv",
+}
+
+# Columns holding usernames, scanned once per run to build the username map
+USERNAME_COLUMNS = {
+    "messages": ("Creator", "Recipient"),
+    "likes": ("Sender", "Receiver"),
+    "friend_testimonials": ("Creator", "Subject"),
+    "met_ups": ("Creator", "User 2"),
+    "user_links": ("User",),
+    "videos": ("Creator",),
+}
+
+# Export columns naming a user, resolved with get_user_id()
+NAME_COLUMNS = {
+    **USERNAME_COLUMNS,
+    "app_testimonials": ("Creator",),
+    "pairings": ("Match 1 ", "Match 2", "Match 2 Alt name"),
+}
+
+# Column order of each migrated table. Transformed rows are tuples of these
+# (ROW_TYPES), and every sink writes them in this order.
+TABLE_COLUMNS = {
+    "users": ("id", "bubble_id", "email", "age", "short_description", "background_color",
+              "consent", "collaborators", "communities"),
+    "user_links": ("id", "user_id", "label", "url", "created_at", "updated_at"),
+    "projects": ("id", "user_id", "name", "description", "link", "photo_url", "display_order",
+                 "created_at", "updated_at"),
+    "videos": ("id", "user_id", "url", "created_at", "updated_at"),
+    "likes": ("id", "sender_id", "receiver_id", "created_at"),
+    "met_ups": ("id", "user1_id", "user2_id", "created_at"),
+    "messages": ("id", "sender_id", "recipient_id", "content", "created_at", "updated_at"),
+    "friend_testimonials": ("id", "author_id", "subject_id", "content", "created_at", "updated_at"),
+    "app_testimonials": ("id", "author_id", "username", "content", "created_at", "updated_at"),
+    "pairings": ("id", "match1_id", "match2_id", "match1_name", "match2_name", "match2_alt_name",
+                 "contact_info", "description", "here_for", "anonymous"),
+}
+
+ROW_TYPES = {
+    table: namedtuple("".join(part.title() for part in table.split("_")) + "Row", columns)
+    for table, columns in TABLE_COLUMNS.items()
+}
+
+# Username placeholder rows written to users by the username_map step
+UsernameRow = namedtuple("UsernameRow", ("id", "username"))
+
+# Columns holding users(id) foreign keys, per table
+USER_REFERENCES = {
+    "user_links": ("user_id",),
+    "projects": ("user_id",),
+    "videos": ("user_id",),
+    "likes": ("sender_id", "receiver_id"),
+    "met_ups": ("user1_id", "user2_id"),
+    "messages": ("sender_id", "recipient_id"),
+    "friend_testimonials": ("author_id", "subject_id"),
+    "app_testimonials": ("author_id",),
+    "pairings": ("match1_id", "match2_id"),
+}
+
+# Section title and record noun used in progress output
+TABLE_LABELS = {
+    "users": ("Users", "user"),
+    "user_links": ("User Links", "user link"),
+    "projects": ("Projects", "project"),
+    "videos": ("Videos", "video"),
+    "likes": ("Likes", "like"),
+    "met_ups": ("Met Ups", "met up"),
+    "messages": ("Messages", "message"),
+    "friend_testimonials": ("Friend Testimonials", "friend testimonial"),
+    "app_testimonials": ("App Testimonials", "app testimonial"),
+    "pairings": ("Pairings", "pairing"),
+}
+
+# Username resolution for direct connections; resolve_usernames.sql holds the
+# same statement as a function for Supabase mode. Usernames already present
+# keep their row's id; a row whose id was derived for a username (an email
+# user's Name) gains that username if it has none. No rows are inserted:
+# users need an email, so usernames matching no row come back unmapped.
+RESOLVE_USERNAMES_SQL = """
+    WITH input AS (
+        SELECT * FROM unnest(%s::text[], %s::uuid[]) AS t(username, id)
+    ),
+    existing AS (
+        SELECT u.username, u.id FROM users u JOIN input i ON i.username = u.username
+    ),
+    by_id AS (
+        SELECT i.username, u.id FROM users u JOIN input i ON i.id = u.id
+        WHERE NOT EXISTS (SELECT 1 FROM existing e WHERE e.username = i.username)
+    ),
+    named AS (
+        UPDATE users u SET username = b.username FROM by_id b
+        WHERE u.id = b.id AND u.username IS NULL
+    )
+    SELECT username, id FROM existing
+    UNION ALL
+    SELECT username, id FROM by_id
 """
 
-import csv
-import os
-import re
-import uuid
-from datetime import datetime
-from pathlib import Path
-from typing import Optional
-import argparse
+# Conflict clause for username placeholder rows: an existing row (e.g. an
+# email user with the same derived id) only gains the username
+USERNAME_UPSERT = "ON CONFLICT (id) DO UPDATE SET username = COALESCE(users.username, EXCLUDED.username)"
+
+# Columns identifying duplicate relationship rows; the first row wins
+DEDUPE_KEYS = {
+    "users": ("email",),
+    "likes": ("sender_id", "receiver_id"),
+    "met_ups": ("user1_id", "user2_id"),
+}
+
+# Conflict handling when inserting into each table
+DEFAULT_CONFLICT = "ON CONFLICT DO NOTHING"
+# SQLSTATE classes that mean a row was rejected (data exception, integrity
+# constraint violation); batches failing with these are bisected
+ROW_ERROR_CLASSES = ("22", "23")
+# SQLSTATEs that mean the server won't take COPY FROM STDIN at all
+# (feature_not_supported, insufficient_privilege); only these switch a run
+# over to multi-row INSERTs
+COPY_UNSUPPORTED_CODES = ("0A000", "42501")
+
+CONFLICT_CLAUSES = {
+    "users": "ON CONFLICT (email) DO NOTHING",
+}
+
+# Migration steps in default order, each mapped to the steps it depends on.
+# Every table only needs user ids, so they can all run once the map is built.
+MIGRATION_STEPS = {
+    "users": (),
+    "username_map": ("users",),
+    "user_links": ("username_map",),
+    "projects": ("username_map",),
+    "videos": ("username_map",),
+    "likes": ("username_map",),
+    "met_ups": ("username_map",),
+    "messages": ("username_map",),
+    "friend_testimonials": ("username_map",),
+    "app_testimonials": ("username_map",),
+    "pairings": ("username_map",),
+}
+
+# Namespace for deterministic uuid5 ids derived from Bubble identities
+ID_NAMESPACE = uuid.UUID("60675232-82a6-45eb-99c2-ea5963f41773")
+
+# Progress manifest written next to the exports, used by --resume
+CHECKPOINT_FILE = ".migration_checkpoint.json"
+
+# Rows the database rejected, with the reason (JSON lines, or CSV by suffix)
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+# Optional alias,username CSV next to the exports: alternative names (or
+# emails) that resolve to a user
+NAME_ALIASES_FILE = "name_aliases.csv"
+
+# NameIndex fuzzy fallback: trigram similarity (shared / union) a name
+# needs to match, and by how much it must beat the runner-up. Trigrams in
+# more than NAME_FUZZY_MAX_POSTINGS names are too common to narrow the
+# search and are skipped; the NAME_FUZZY_CANDIDATES names sharing the most
+# trigrams are scored.
+NAME_FUZZY_MIN_SIMILARITY = 0.5
+NAME_FUZZY_MARGIN = 0.1
+NAME_FUZZY_MAX_POSTINGS = 1000
+NAME_FUZZY_CANDIDATES = 20
+NAME_FUZZY_MIN_LENGTH = 4
+
+# Unresolved names listed in the run summary
+NAME_UNRESOLVED_SHOWN = 10
+
+# --sync state (export files, high-water marks and row fingerprints per
+# table) and the report of rows missing from newer exports
+SYNC_STATE_FILE = ".sync_state.sqlite3"
+SYNC_DELETIONS_FILE = "sync_deletions.jsonl"
+
+# Bubble export file names: export_All-<Type>_<YYYY-MM-DD_HH-MM-SS>.csv,
+# possibly archived as .csv.gz or .csv.zst
+EXPORT_NAME_RE = re.compile(r"^(export_All-.+)_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.csv(\.gz|\.zst)?$")
+
+# Tables --sync inserts without updating: edges identified by their
+# DEDUPE_KEYS pair rather than by id, whose rows never change
+SYNC_INSERT_ONLY = ("likes", "met_ups")
+
+# Records committed per batch (and checkpoint) on the in-memory path
+COMMIT_EVERY = 50_000
+
+# Supabase REST upload tuning. Requests are sized by encoded bytes; the row
+# cap starts at REST_BATCH_SIZE and adapts to observed latency and errors.
+REST_BATCH_SIZE = 100
+REST_MAX_BATCH_ROWS = 5000
+REST_BATCH_BYTES = 1 << 20
+REST_MIN_BATCH_BYTES = 1 << 10
+REST_TARGET_LATENCY = 1.0  # seconds
+REST_CONCURRENCY = 8
+REST_MAX_RETRIES = 5
+REST_BACKOFF_BASE = 0.5  # seconds
+REST_BACKOFF_CAP = 30.0
+
+# Stages reported by MigrationMetrics, in pipeline order
+METRIC_STAGES = ("read", "transform", "dedupe", "write", "commit")
+
+# Upper bounds (ms) of the batch write latency histogram buckets
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+# --sql-only output location and write size
+DUMP_DIR = EXPORT_DIR.parent / "supabase" / "seed_data"
+DUMP_CHUNK_BYTES = 1 << 20
+# --gzip level: 9 compresses ~40% slower than 6 for files under 1% smaller
+DUMP_GZIP_LEVEL = 6
+
+# Read buffer for exports; compressed ones are decompressed this much at a time
+READ_BUFFER_SIZE = 1 << 20
+
+# Exports larger than this are split into chunks of about this size and
+# transformed in --transform-workers processes
+TRANSFORM_CHUNK_BYTES = 8 << 20
+
+# --verify buckets rows by the first hex digits of their id, using enough
+# digits (at most VERIFY_PREFIX_MAX) for about VERIFY_BUCKET_ROWS rows per
+# bucket. Rows of at most VERIFY_MAX_BUCKETS differing buckets per table
+# are fetched and compared; VERIFY_SAMPLE_IDS ids of each kind are printed.
+VERIFY_BUCKET_ROWS = 1000
+VERIFY_PREFIX_MAX = 4
+VERIFY_MAX_BUCKETS = 256
+VERIFY_SAMPLE_IDS = 5
+
+# Database rows --verify compares with the exports: username placeholder
+# users (no email) aren't export rows
+VERIFY_FILTERS = {
+    "users": "email IS NOT NULL",
+}
+
+# Batches transformed ahead of the --pipeline loaders; the producer blocks
+# once this many are waiting
+PIPELINE_DEPTH = 4
+
+# --partitions: exports larger than this are loaded over several pooled
+# connections at once, one transaction per partition; a partition that
+# fails is retried alone this many times
+PARTITION_MIN_BYTES = 4 << 20
+PARTITION_RETRIES = 2
+
+# Direct connection bulk load tuning
+COPY_BUFFER_SIZE = 1 << 16
+INSERT_PAGE_SIZE = 1000
+
+# --fast-load staging tables and the memory given to rebuilding indexes
+FAST_LOAD_PREFIX = "_fastload_"
+FAST_LOAD_MAINTENANCE_MEM = "512MB"
+
+# --push-down raw export tables, transformed rows and username lookup table
+PUSH_DOWN_RAW_PREFIX = "_raw_"
+PUSH_DOWN_PREFIX = "_pushdown_"
+PUSH_DOWN_USERNAMES = "_pushdown_usernames"
+
+
+_MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1
+    )
+}
+
+# Bubble export timestamps: "Jul 19, 2023 3:11 am", optionally with seconds,
+# a full month name and a trailing UTC offset ("Z", "UTC", "+02:00", "-0500").
+_BUBBLE_DATE_RE = re.compile(
+    r"\s*([A-Za-z]{3})[A-Za-z]*\.?\s+(\d{1,2}),\s*(\d{4})"
+    r"(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?\s*([AaPp][Mm]))?"
+    r"(?:\s*(Z|UTC|GMT|[+-]\d{2}:?\d{2}))?\s*$"
+)
+
+
+def _parse_offset(text: str) -> timezone:
+    """Convert "Z"/"UTC"/"+02:00"/"-0500" to a fixed-offset timezone."""
+    if text in ("Z", "UTC", "GMT"):
+        return timezone.utc
+    sign = -1 if text[0] == "-" else 1
+    digits = text[1:].replace(":", "")
+    return timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+
+
+@lru_cache(maxsize=65536)
+def _parse_bubble_date(date_str: str) -> Optional[datetime]:
+    match = _BUBBLE_DATE_RE.match(date_str)
+    if match is None:
+        # Fall back to ISO 8601, which some API-sourced exports use
+        try:
+            return datetime.fromisoformat(date_str.strip())
+        except ValueError:
+            return None
+
+    month, day, year, hour, minute, second, meridiem, offset = match.groups()
+    month_number = _MONTHS.get(month.lower())
+    if month_number is None:
+        return None
+
+    h = m = sec = 0
+    if hour is not None:
+        h = int(hour)
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if meridiem[0] in "Pp" else 0)
+        m = int(minute)
+        sec = int(second) if second else 0
+
+    try:
+        return datetime(int(year), month_number, int(day), h, m, sec,
+                        tzinfo=_parse_offset(offset) if offset else None)
+    except ValueError:
+        return None
+
+
+def parse_date(date_str: str) -> Optional[datetime]:
+    """Parse Bubble date format to datetime.
+
+    Bubble timestamps are minute-granular and repeat heavily, so results are
+    memoized. Values without an explicit offset stay naive, as before.
+    """
+    if not date_str:
+        return None
+    return _parse_bubble_date(date_str)
+
+
+def parse_array(value: str) -> list:
+    """Parse comma-separated string to array."""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_bool(value: str) -> bool:
+    """Parse yes/no to boolean."""
+    return value.lower() == "yes" if value else False
+
+
+# COPY text format escapes (backslash must come first)
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _pg_array_element(value) -> str:
+    """Quote a single element of a PostgreSQL array literal."""
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def copy_value(value) -> str:
+    """Encode a Python value as a field in PostgreSQL COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, (list, tuple)):
+        text = "{" + ",".join(_pg_array_element(v) for v in value) + "}"
+    else:
+        text = str(value)
+    return text.translate(_COPY_ESCAPES)
+
+
+class CopyStream(io.RawIOBase):
+    """File-like object that encodes records as COPY text lazily.
+
+    psycopg2's copy_expert() pulls data with read(), so rows are encoded
+    as they are sent instead of building the whole payload in memory.
+    """
+
+    def __init__(self, records: Iterable[tuple]):
+        self._lines = (("\t".join(map(copy_value, record)) + "\n").encode("utf-8") for record in records)
+        self._buffer = b""
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = b"".join(chunks)
+        if size < 0:
+            self._buffer = b""
+        else:
+            self._buffer = data[size:]
+            data = data[:size]
+        self.bytes_read += len(data)
+        return data
+
+
+def _json_default(value):
+    """JSON encoder hook for values PostgREST accepts as strings."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def record_dict(record) -> dict:
+    """Column name -> value mapping of a row tuple, for JSON and error reports."""
+    return record._asdict() if hasattr(record, "_asdict") else dict(record)
+
+
+def is_row_error(error: Exception) -> bool:
+    """True if a database error blames the rows sent rather than the connection."""
+    code = getattr(error, "pgcode", None) or getattr(error, "code", None)
+    return str(code or "")[:2] in ROW_ERROR_CLASSES
+
+
+class AdaptiveBatcher:
+    """Groups encoded records into batches under a byte budget and a row cap.
+
+    The row cap starts at `rows` and is steered by observe(): it doubles while
+    row-limited requests finish well under `target_latency`, shrinks in
+    proportion when they run over, and halves on errors or retries. The byte
+    budget only ever shrinks, when the server rejects a body as too large.
+    A `fixed` batcher (a --batch-size override) keeps its row cap.
+    """
+
+    def __init__(self, max_bytes: int = REST_BATCH_BYTES, rows: int = REST_BATCH_SIZE,
+                 max_rows: int = REST_MAX_BATCH_ROWS, target_latency: float = REST_TARGET_LATENCY,
+                 fixed: bool = False):
+        self.max_bytes = max_bytes
+        self.rows = rows
+        self.max_rows = max(rows, max_rows)
+        self.target_latency = target_latency
+        self.fixed = fixed
+
+    def batches(self, items: Iterable, size=len) -> Iterator[list]:
+        """Yield lists of items, closing each before it exceeds either limit.
+
+        Limits are read per batch, so feedback from batches already sent
+        applies to the next one. An item larger than the byte budget is
+        sent on its own.
+        """
+        batch: list = []
+        nbytes = 0
+        for item in items:
+            n = size(item)
+            if batch and (len(batch) >= self.rows or nbytes + n > self.max_bytes):
+                yield batch
+                batch, nbytes = [], 0
+            batch.append(item)
+            nbytes += n
+        if batch:
+            yield batch
+
+    def observe(self, rows: int, seconds: float, errors: int = 0):
+        """Adjust the row cap from one request's size, latency and error count."""
+        if self.fixed:
+            return
+        if errors:
+            self.rows = max(1, min(self.rows, rows) // 2)
+        elif seconds > self.target_latency:
+            self.rows = max(1, int(min(self.rows, rows) * max(0.5, self.target_latency / seconds)))
+        elif seconds < self.target_latency / 2 and rows >= self.rows:
+            self.rows = min(self.max_rows, self.rows * 2)
+
+    def shrink_bytes(self, rejected: int):
+        """Halve the byte budget below a body size the server refused."""
+        self.max_bytes = max(REST_MIN_BATCH_BYTES, min(self.max_bytes, rejected // 2))
+
+
+class PayloadTooLarge(RuntimeError):
+    """The server rejected a request body as too large (HTTP 413)."""
+
+
+class RowsRejected(RuntimeError):
+    """The server rejected a batch's contents (HTTP 400/409), e.g. a constraint violation.
+
+    `code` is the SQLSTATE (or PGRST error code) from PostgREST's JSON body.
+    """
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class RestUploader:
+    """Concurrent batch uploader for the Supabase (PostgREST) insert endpoint.
+
+    Batches are POSTed to {url}/rest/v1/{table} over one pooled httpx client
+    with at most `concurrency` requests in flight. 429/5xx responses and
+    transport errors are retried with full-jitter exponential backoff,
+    honouring Retry-After. Point `url` at a local stand-in to exercise the
+    pipeline without a Supabase project.
+    """
+
+    # Prefer header for upserts: rows with an existing id replace it
+    UPSERT_HEADERS = {"Prefer": "return=minimal,resolution=merge-duplicates"}
+
+    def __init__(self, url: str, key: str, concurrency: int = REST_CONCURRENCY,
+                 max_retries: int = REST_MAX_RETRIES, timeout: float = 60.0):
+        self.endpoint = url.rstrip("/") + "/rest/v1"
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+            # Replayed batches after --resume hit existing ids; skip them
+            "Prefer": "return=minimal,resolution=ignore-duplicates",
+        }
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # One event loop and client per uploader so connections are reused
+        # across tables; each worker thread owns its own uploader.
+        self._loop = asyncio.new_event_loop()
+        self._client: Optional["httpx.AsyncClient"] = None
+        self.bytes_sent = 0
+        self.failed_batches = 0
+        self.rejected_rows = 0
+
+    def insert(self, table: str, records: Iterable[tuple],
+               batcher: Optional[AdaptiveBatcher] = None, on_reject=None, upsert: bool = False) -> int:
+        """Upload records in byte-budgeted batches and return the number of rows accepted.
+
+        Pass the same `batcher` across calls for a table so its tuning carries
+        over. Batches whose contents are rejected are bisected down to the
+        offending rows, which are passed to `on_reject(record, reason)` along
+        with the rows of batches that failed outright. With `upsert`, rows
+        whose id exists update it instead of being skipped.
+        """
+        return self._loop.run_until_complete(
+            self._upload(table, records, batcher or AdaptiveBatcher(), on_reject, upsert))
+
+    def close(self):
+        if self._client is not None:
+            self._loop.run_until_complete(self._client.aclose())
+            self._client = None
+        self._loop.close()
+
+    async def _upload(self, table: str, records: Iterable[tuple], batcher: AdaptiveBatcher,
+                      on_reject=None, upsert: bool = False) -> int:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.concurrency,
+                                  max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(headers=self.headers, limits=limits, timeout=self.timeout)
+
+        path, headers = (f"{table}?on_conflict=id", self.UPSERT_HEADERS) if upsert else (table, None)
+        slots = asyncio.Semaphore(self.concurrency)
+        pending: set[asyncio.Task] = set()
+        inserted = 0
+
+        async def send(batch: list[bytes]):
+            nonlocal inserted
+            try:
+                accepted = await self._post(path, batch, batcher, on_reject, headers)
+                inserted += accepted
+            except Exception as e:
+                self.failed_batches += 1
+                print(f"  Error inserting into {table}: {e}")
+                self._reject(batch, str(e), on_reject)
+            finally:
+                slots.release()
+
+        # Each record is encoded once, both to size the batch and as part of
+        # its body. Acquiring a slot before building each task keeps at most
+        # `concurrency` batches encoded and in flight at once.
+        encoded = (json.dumps(record_dict(record), default=_json_default, separators=(",", ":")).encode("utf-8")
+                   for record in records)
+        for batch in batcher.batches(encoded):
+            await slots.acquire()
+            task = asyncio.create_task(send(batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        return inserted
+
+    def rpc(self, function: str, params: dict):
+        """Call a PostgREST RPC function and return its decoded JSON result."""
+        return self._loop.run_until_complete(self._rpc(function, params))
+
+    async def _rpc(self, function: str, params: dict):
+        if self._client is None:
+            self._client = httpx.AsyncClient(headers=self.headers, timeout=self.timeout)
+        body = json.dumps(params, default=_json_default).encode("utf-8")
+        response, _ = await self._request(f"rpc/{function}", body)
+        return response.json()
+
+    def _reject(self, batch: list[bytes], reason: str, on_reject=None):
+        self.rejected_rows += len(batch)
+        if on_reject:
+            for row in batch:
+                on_reject(json.loads(row), reason)
+
+    async def _post(self, path: str, batch: list[bytes], batcher: AdaptiveBatcher,
+                    on_reject=None, headers: Optional[dict] = None) -> int:
+        """POST one batch of encoded rows, feeding its latency back to the batcher.
+
+        A 413 lowers the byte budget and resends the batch as two halves. A
+        400/409 blaming the rows (is_row_error: a data or constraint error)
+        is bisected the same way until only the offending rows are left;
+        those are rejected and the rest of the batch is inserted. Any other
+        400/409, like an unknown column or a permission error, fails the
+        whole batch at once.
+        """
+        body = b"[" + b",".join(batch) + b"]"
+        started = time.perf_counter()
+        try:
+            _, retries = await self._request(path, body, headers)
+        except PayloadTooLarge:
+            batcher.shrink_bytes(len(body))
+            batcher.observe(len(batch), 0.0, errors=1)
+            if len(batch) == 1:
+                raise
+            half = len(batch) // 2
+            return (await self._post(path, batch[:half], batcher, on_reject, headers)
+                    + await self._post(path, batch[half:], batcher, on_reject, headers))
+        except RowsRejected as e:
+            if not is_row_error(e):
+                batcher.observe(len(batch), time.perf_counter() - started, errors=1)
+                raise
+            if len(batch) == 1:
+                self._reject(batch, str(e), on_reject)
+                return 0
+            half = len(batch) // 2
+            return (await self._post(path, batch[:half], batcher, on_reject, headers)
+                    + await self._post(path, batch[half:], batcher, on_reject, headers))
+        except Exception:
+            batcher.observe(len(batch), time.perf_counter() - started, errors=1)
+            raise
+        self.bytes_sent += len(body)
+        batcher.observe(len(batch), time.perf_counter() - started, errors=retries)
+        return len(batch)
+
+    async def _request(self, path: str, body: bytes,
+                       headers: Optional[dict] = None) -> tuple["httpx.Response", int]:
+        """POST with retries on 429/5xx and transport errors.
+
+        Returns the response and the number of retries it took.
+        """
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = await self._client.post(f"{self.endpoint}/{path}", content=body, headers=headers)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                status = response.status_code
+                if status < 300:
+                    return response, attempt
+                if status == 413:
+                    raise PayloadTooLarge(f"HTTP 413: {len(body)} byte body rejected")
+                if status in (400, 409):
+                    try:
+                        error = response.json()
+                    except ValueError:
+                        error = None
+                    code = error.get("code") if isinstance(error, dict) else None
+                    raise RowsRejected(f"HTTP {status}: {response.text[:200]}", code)
+                if (status != 429 and status < 500) or attempt == self.max_retries:
+                    raise RuntimeError(f"HTTP {status}: {response.text[:200]}")
+                retry_after = response.headers.get("Retry-After")
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        delay = random.uniform(0, min(REST_BACKOFF_CAP, REST_BACKOFF_BASE * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+
+def read_csv(filename: str) -> list[dict]:
+    """Read CSV file and return list of dictionaries."""
+    return list(iter_csv(filename))
+
+
+def iter_csv(filename: str) -> Iterator[dict]:
+    """Stream rows from a CSV file without loading the whole export."""
+    filepath = EXPORT_DIR / filename
+    if not filepath.exists():
+        print(f"Warning: {filepath} not found")
+        return
+
+    with open_export(filepath) as f:
+        yield from csv.DictReader(f)
+
+
+def open_export(filepath: Path, binary: bool = False):
+    """Open an export for reading, decompressing .csv.gz and .csv.zst as it is read.
+
+    Reads go through READ_BUFFER_SIZE buffers. Text mode decodes UTF-8 with
+    universal newlines, like open(); `binary` returns the decompressed bytes.
+    """
+    if filepath.suffix == ".gz":
+        raw = io.BufferedReader(gzip.open(filepath, "rb"), READ_BUFFER_SIZE)
+    elif filepath.suffix == ".zst":
+        if not HAS_ZSTD:
+            raise RuntimeError(f"{filepath.name} is zstd-compressed. Install zstandard to read it")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(filepath, "rb"), read_size=READ_BUFFER_SIZE,
+                                                            closefd=True)
+        raw = io.BufferedReader(reader, READ_BUFFER_SIZE)
+    else:
+        raw = open(filepath, "rb", buffering=READ_BUFFER_SIZE)
+    return raw if binary else io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def is_compressed(filepath: Path) -> bool:
+    """Whether an export is read through a decompressor (no byte offsets or mmap)."""
+    return filepath.suffix in (".gz", ".zst")
+
+
+def csv_chunks(filepath: Path, chunk_bytes: int = TRANSFORM_CHUNK_BYTES) -> tuple[list[str], list[tuple[int, int]]]:
+    """Split a CSV export into byte ranges that each hold whole records.
+
+    Returns the header's field names and (start, end) offsets of the body
+    chunks. A newline only ends a record when it is outside quotes, i.e.
+    after an even number of quote characters since the record began, so
+    quoted multi-line fields (message bodies, Bubble's Value columns) are
+    never cut. Bubble quotes every field that contains a quote, which this
+    relies on.
+    """
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [], []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            def record_end(start: int, target: int) -> int:
+                quotes = data[start:target].count(b'"')
+                end = target
+                while True:
+                    newline = data.find(b"\n", end)
+                    if newline < 0:
+                        return size
+                    quotes += data[end:newline].count(b'"')
+                    end = newline + 1
+                    if quotes % 2 == 0:
+                        return end
+
+            body = record_end(0, 0)
+            header = io.TextIOWrapper(io.BytesIO(data[:body]), encoding="utf-8")
+            fieldnames = next(csv.reader(header), [])
+            ranges = []
+            start = body
+            while start < size:
+                end = record_end(start, start + chunk_bytes) if start + chunk_bytes < size else size
+                ranges.append((start, end))
+                start = end
+    return fieldnames, ranges
+
+
+def dedupe(records: Iterable[tuple], key) -> Iterator[tuple]:
+    """Drop records whose key has already been seen, keeping the first."""
+    seen = set()
+    for record in records:
+        k = key(record)
+        if k in seen:
+            continue
+        seen.add(k)
+        yield record
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def partition_of(row_id: str, partitions: int) -> int:
+    """--partitions partition of a row: the same every run and for every row with this id."""
+    return int(row_id[:8], 16) % partitions
+
+
+def stable_id(*parts: str) -> str:
+    """Deterministic UUID for a Bubble identity, so re-runs produce the same ids."""
+    return str(uuid.uuid5(ID_NAMESPACE, "\x1f".join(parts)))
+
+
+def row_id(table: str, row: dict, ordinal: int) -> str:
+    """Stable id for an export row: Bubble's unique id, else its position in the export."""
+    return stable_id(table, row.get("unique id") or f"#{ordinal}")
+
+
+class UserIds:
+    """Dense integer handles for user UUIDs.
+
+    user_map, email_map and transformed rows' USER_REFERENCES columns hold
+    these small ints instead of 36-character UUID strings; materialize()
+    swaps the strings back in as rows are written. Handles start at 1 so
+    a handle is always truthy, like the id string it stands for.
+    """
+
+    def __init__(self):
+        self.uuids: list[Optional[str]] = [None]
+        self._handles: dict[str, int] = {}
+
+    def intern(self, user_id: str) -> int:
+        handle = self._handles.get(user_id)
+        if handle is None:
+            handle = self._handles[user_id] = len(self.uuids)
+            self.uuids.append(user_id)
+        return handle
+
+    def __getitem__(self, handle: int) -> str:
+        return self.uuids[handle]
+
+    def __len__(self) -> int:
+        return len(self.uuids) - 1
+
+    def materialize(self, table: str, records: Iterable[tuple]) -> Iterator[tuple]:
+        """Yield rows of a table with user handles replaced by UUID strings."""
+        positions = [TABLE_COLUMNS[table].index(column) for column in USER_REFERENCES.get(table, ())]
+        if not positions:
+            yield from records
+            return
+        uuids = self.uuids
+        make = ROW_TYPES[table]._make
+        for record in records:
+            values = list(record)
+            for position in positions:
+                if values[position]:
+                    values[position] = uuids[values[position]]
+            yield make(values)
+
+
+def dedupe_key(table: str):
+    """Key function over a table's DEDUPE_KEYS columns.
+
+    An edge between two users is keyed on one packed 64-bit int of their
+    handles, which keeps the seen-set small for very large edge tables.
+    """
+    columns = TABLE_COLUMNS[table]
+    keys = DEDUPE_KEYS[table]
+    positions = [columns.index(column) for column in keys]
+    if len(keys) == 2 and set(keys) <= set(USER_REFERENCES.get(table, ())):
+        first, second = positions
+        return lambda record: record[first] << 32 | record[second]
+    return itemgetter(*positions)
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_name(name: str) -> str:
+    """Resolution key of a free-text name: NFKC, casefolded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+# Bubble's author for rows created from the admin app; never a user, in any spelling
+ADMIN_NAME_KEY = normalize_name("(App admin)")
+
+
+def _trigrams(key: str) -> frozenset:
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _claim(keys: dict[str, Optional[int]], key: str, handle: int):
+    """Point key at handle; a key claimed for two users becomes ambiguous (None)."""
+    keys[key] = handle if keys.get(key, handle) == handle else None
+
+
+def load_name_aliases(path: Path) -> dict[str, str]:
+    """Read an alias,username CSV (the username column may also hold an email)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["alias"].strip(): row["username"].strip() for row in csv.DictReader(f)
+                if row.get("alias", "").strip() and row.get("username", "").strip()}
+
+
+class NameIndex:
+    """Resolves free-text names to user handles, built once per run.
+
+    get_user_id() looks names up in user_map itself, the common path;
+    lookup() takes the names it misses and tries their normalized key
+    (normalize_name), then the aliases, then a bounded trigram search over
+    the normalized names. Outcomes are cached per name, so a name costs at
+    most one search per run however many rows carry it. A key shared by
+    different users is ambiguous and resolves to nothing. Counts by
+    outcome and the unresolved names are kept for the run summary. Shared
+    by every scheduler worker; worker processes get a copy and hand their
+    counts back with take_stats().
+    """
+
+    OUTCOMES = ("normalized", "alias", "fuzzy", "ambiguous", "unresolved")
+
+    def __init__(self, user_map: Optional[dict[str, int]] = None):
+        self.user_map = user_map if user_map is not None else {}
+        self.keys: dict[str, Optional[int]] = {}
+        self.aliases: dict[str, Optional[int]] = {}
+        self.counts: Counter = Counter()
+        self.unresolved: Counter = Counter()
+        self._cache: dict[str, tuple[str, Optional[int]]] = {}
+        self._grams: Optional[dict[str, list[int]]] = None
+        self._candidates: list[tuple[int, int]] = []  # (handle, trigram count) per fuzzy candidate
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def rebuild(self, aliases: Optional[dict[str, str]] = None, email_map: Optional[dict[str, int]] = None) -> int:
+        """Re-index user_map and the aliases; returns the number of aliases naming no known user."""
+        keys: dict[str, Optional[int]] = {}
+        for username, handle in self.user_map.items():
+            _claim(keys, normalize_name(username), handle)
+        alias_keys: dict[str, Optional[int]] = {}
+        unknown = 0
+        for alias, target in (aliases or {}).items():
+            handle = self.user_map.get(target) or (email_map or {}).get(target) or keys.get(normalize_name(target))
+            if handle:
+                _claim(alias_keys, normalize_name(alias), handle)
+            else:
+                unknown += 1
+        with self._lock:
+            self.keys, self.aliases = keys, alias_keys
+            self._cache.clear()
+            self._grams = None
+        return unknown
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Resolve a stripped name that is not in user_map to a user handle, or None."""
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is None:
+                cached = self._cache[name] = self._resolve(name)
+            outcome, handle = cached
+            self.counts[outcome] += 1
+            if handle is None:
+                self.unresolved[name] += 1
+        return handle
+
+    def _resolve(self, name: str) -> tuple[str, Optional[int]]:
+        key = normalize_name(name)
+        for outcome, keys in (("normalized", self.keys), ("alias", self.aliases)):
+            if key in keys:
+                return (outcome, keys[key]) if keys[key] is not None else ("ambiguous", None)
+        handle = self._fuzzy(key)
+        return ("fuzzy", handle) if handle is not None else ("unresolved", None)
+
+    def _fuzzy(self, key: str) -> Optional[int]:
+        if len(key) < NAME_FUZZY_MIN_LENGTH:
+            return None
+        if self._grams is None:
+            self._grams = {}
+            self._candidates = []
+            for keys in (self.keys, self.aliases):
+                for candidate, handle in keys.items():
+                    if handle is None or len(candidate) < NAME_FUZZY_MIN_LENGTH:
+                        continue
+                    grams = _trigrams(candidate)
+                    for gram in grams:
+                        self._grams.setdefault(gram, []).append(len(self._candidates))
+                    self._candidates.append((handle, len(grams)))
+
+        grams = _trigrams(key)
+        shared: Counter = Counter()
+        for gram in grams:
+            postings = self._grams.get(gram, ())
+            if len(postings) <= NAME_FUZZY_MAX_POSTINGS:
+                shared.update(postings)
+        scores: dict[int, float] = {}
+        for candidate, common in shared.most_common(NAME_FUZZY_CANDIDATES):
+            handle, count = self._candidates[candidate]
+            similarity = common / (len(grams) + count - common)
+            scores[handle] = max(scores.get(handle, 0.0), similarity)
+        ranked = sorted(scores.values(), reverse=True)
+        if not ranked or ranked[0] < NAME_FUZZY_MIN_SIMILARITY:
+            return None
+        if len(ranked) > 1 and ranked[0] - ranked[1] < NAME_FUZZY_MARGIN:
+            return None
+        return next(handle for handle, similarity in scores.items() if similarity == ranked[0])
+
+    def take_stats(self) -> tuple[Counter, Counter]:
+        """Return and reset the outcome and unresolved-name counts."""
+        with self._lock:
+            stats = (self.counts, self.unresolved)
+            self.counts, self.unresolved = Counter(), Counter()
+        return stats
+
+    def merge_stats(self, counts: Counter, unresolved: Counter):
+        with self._lock:
+            self.counts.update(counts)
+            self.unresolved.update(unresolved)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {"lookups": {outcome: self.counts[outcome] for outcome in self.OUTCOMES},
+                    "unresolved_names": dict(self.unresolved.most_common())}
+
+    def summary(self) -> list[str]:
+        report = self.report()
+        lookups = report["lookups"]
+        if not sum(lookups.values()):
+            return []
+        lines = ["Names not matched exactly: " + ", ".join(f"{n} {outcome}" for outcome, n in lookups.items())]
+        if self.unresolved:
+            top = self.unresolved.most_common(NAME_UNRESOLVED_SHOWN)
+            lines.append(f"  {len(self.unresolved)} distinct unresolved names, most frequent: "
+                         + ", ".join(f"{name!r} ({n})" for name, n in top))
+        return lines
+
+
+def export_fingerprint() -> dict[str, list]:
+    """Size and mtime of every export, used to tie a checkpoint to its input."""
+    fingerprint = {}
+    for name, filename in CSV_FILES.items():
+        try:
+            stat = (EXPORT_DIR / filename).stat()
+            fingerprint[name] = [filename, stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            fingerprint[name] = [filename, None, None]
+    return fingerprint
+
+
+def latest_exports(directory: Optional[Path] = None) -> dict[str, str]:
+    """Newest export file of every CSV_FILES table in `directory`, by the timestamp in its name.
+
+    Files are matched by the table's export name prefix, compressed or not
+    (.zst only with zstandard installed); of equally new files the plain
+    CSV wins, since only it can be split across --transform-workers.
+    Tables with no matching file keep their CSV_FILES entry.
+    """
+    directory = directory or EXPORT_DIR
+    latest = {}
+    for name, filename in CSV_FILES.items():
+        prefix = EXPORT_NAME_RE.match(filename).group(1)
+        candidates = [(match.group(2), not match.group(3), path.name) for path in directory.glob(f"{prefix}_*.csv*")
+                      if (match := EXPORT_NAME_RE.match(path.name)) and match.group(1) == prefix
+                      and (HAS_ZSTD or match.group(3) != ".zst")]
+        latest[name] = max(candidates)[2] if candidates else filename
+    return latest
+
+
+def upsert_clause(table: str) -> str:
+    """Conflict clause updating every column of the existing row with the same id (--sync)."""
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in TABLE_COLUMNS[table] if column != "id")
+    return f"ON CONFLICT (id) DO UPDATE SET {updates}"
+
+
+class Checkpoint:
+    """JSON manifest of completed steps and committed record offsets.
+
+    The manifest is rewritten atomically after every committed batch, so a
+    crash leaves at worst one batch to re-send; deterministic ids and the
+    conflict clauses make that replay harmless.
+    """
+
+    def __init__(self, path: Optional[Path] = None, fingerprint: Optional[dict] = None):
+        self.path = path
+        self.state = {"export": fingerprint or {}, "steps": {}}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: Path, resume: bool = False) -> "Checkpoint":
+        """Load the manifest at `path` when resuming, otherwise start a fresh one."""
+        checkpoint = cls(path, export_fingerprint())
+        if resume and path.exists():
+            state = json.loads(path.read_text())
+            if state.get("export") != checkpoint.state["export"]:
+                raise ValueError(f"Exports changed since {path} was written; rerun without --resume")
+            checkpoint.state = state
+            print(f"Resuming from checkpoint {path}")
+        checkpoint._save()
+        return checkpoint
+
+    def is_done(self, step: str) -> bool:
+        return self.state["steps"].get(step, {}).get("done", False)
+
+    def offset(self, step: str) -> int:
+        return self.state["steps"].get(step, {}).get("offset", 0)
+
+    def record_offset(self, step: str, offset: int):
+        with self._lock:
+            self.state["steps"].setdefault(step, {})["offset"] = offset
+            self._save()
+
+    def mark_done(self, step: str):
+        with self._lock:
+            self.state["steps"].setdefault(step, {})["done"] = True
+            self._save()
+
+    def partitions(self, step: str, count: int) -> set[int]:
+        """Partitions of a step committed while it was loaded in `count` partitions."""
+        entry = self.state["steps"].get(step, {}).get("partitions", {})
+        return set(entry.get("committed", ())) if entry.get("count") == count else set()
+
+    def record_partition(self, step: str, partition: int, count: int):
+        with self._lock:
+            entry = self.state["steps"].setdefault(step, {}).setdefault("partitions", {})
+            if entry.get("count") != count:
+                entry.update(count=count, committed=[])
+            entry["committed"] = sorted({*entry["committed"], partition})
+            self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2))
+        os.replace(tmp, self.path)
+
+
+class DeadLetters:
+    """Append-only file of rows the database rejected, with the reason.
+
+    Written as JSON lines ({"table", "reason", "record"}), or as CSV with a
+    JSON-encoded record column when the path ends in .csv. The file is only
+    created once a row is rejected, so clean runs leave nothing behind.
+    Shared by all scheduler workers, so writes take a lock.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.counts: dict[str, int] = {}
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def add(self, table: str, record, reason: str):
+        record = record_dict(record)
+        reason = reason.strip().splitlines()[0] if reason.strip() else "rejected"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", newline="", encoding="utf-8")
+                if self.path.suffix == ".csv":
+                    self._writer = csv.writer(self._file)
+                    if self._file.tell() == 0:
+                        self._writer.writerow(["table", "reason", "record"])
+            if self._writer:
+                self._writer.writerow([table, reason, json.dumps(record, default=_json_default)])
+            else:
+                self._file.write(json.dumps({"table": table, "reason": reason, "record": record},
+                                            default=_json_default) + "\n")
+            self._file.flush()
+            self.counts[table] = self.counts.get(table, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._writer = None
+
+
+class SyncState:
+    """Per-table bookkeeping for --sync, kept in a SQLite file next to the exports.
+
+    For every table it records the export last synced (name, size, mtime),
+    a digest of the username map it was transformed with, the newest
+    Modified (or Creation) Date seen as a high-water mark, and a 64-bit
+    fingerprint of each row by id. changed() passes on only rows that are
+    new or whose fingerprint differs. Rows dated before the mark are taken
+    as unchanged without hashing them, unless the username map changed
+    since the table's last sync, which can move rows to other user ids.
+    Ids missing from the new export are reported, not deleted. Nothing is
+    stored until commit(), called once all of a table's changes are
+    written, so an interrupted sync redoes the table's changes next time.
+    Shared by all scheduler workers, so database access takes a lock.
+    """
+
+    def __init__(self, path: Path, deletions_path: Optional[Path] = None):
+        self.path = path
+        self.deletions = DeadLetters(deletions_path or path.parent / SYNC_DELETIONS_FILE)
+        self.user_map_digest = ""
+        self._pending: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS exports (tbl TEXT PRIMARY KEY, filename TEXT, "
+                              "size INTEGER, mtime_ns INTEGER, user_map TEXT, high_water TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS fingerprints (tbl TEXT, id TEXT, digest INTEGER, "
+                              "PRIMARY KEY (tbl, id)) WITHOUT ROWID")
+
+    def note_user_map(self, user_map: dict[str, str], aliases: Optional[dict[str, str]] = None):
+        """Record the username -> id map (and name aliases) this run transforms with."""
+        digest = hashlib.blake2b(digest_size=16)
+        for username, user_id in sorted(user_map.items()):
+            digest.update(f"{username}\0{user_id}\0".encode("utf-8"))
+        for alias, target in sorted((aliases or {}).items()):
+            digest.update(f"{alias}\1{target}\0".encode("utf-8"))
+        self.user_map_digest = digest.hexdigest()
+
+    def _export(self, table: str) -> Optional[tuple]:
+        with self._lock:
+            return self.conn.execute("SELECT filename, size, mtime_ns, user_map, high_water FROM exports "
+                                     "WHERE tbl = ?", (table,)).fetchone()
+
+    @staticmethod
+    def _stat(table: str) -> tuple:
+        filename = CSV_FILES[table]
+        try:
+            stat = (EXPORT_DIR / filename).stat()
+            return filename, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return filename, None, None
+
+    def unchanged(self, table: str) -> bool:
+        """True if the table's export and the username map are the ones it was last synced from."""
+        synced = self._export(table)
+        return synced is not None and synced[:3] == self._stat(table) and synced[3] == self.user_map_digest
+
+    def changed(self, table: str, records: Iterable[tuple], user_ids: UserIds) -> Iterator[tuple]:
+        """Yield the records of a table that are new or changed since its last sync.
+
+        Records keep their user handles; fingerprints are taken over the
+        materialized row, so they don't depend on this run's handles.
+        """
+        columns = TABLE_COLUMNS[table]
+        id_index = columns.index("id")
+        stamp_column = next((c for c in ("updated_at", "created_at") if c in columns), None)
+        stamp_index = columns.index(stamp_column) if stamp_column else None
+
+        synced = self._export(table)
+        with self._lock:
+            known = dict(self.conn.execute("SELECT id, digest FROM fingerprints WHERE tbl = ?", (table,)))
+        mark = None
+        if synced and synced[4] and synced[3] == self.user_map_digest:
+            mark = datetime.fromisoformat(synced[4])
+        high_water = datetime.fromisoformat(synced[4]) if synced and synced[4] else None
+
+        seen: set[str] = set()
+        updates: dict[str, int] = {}
+        # Registered up front: rows are written (and rejected) while this runs
+        pending = self._pending[table] = {"updates": updates, "deleted": [], "high_water": high_water}
+        new = changed = 0
+        originals, rows = tee(records)
+        for record, row in zip(originals, user_ids.materialize(table, rows)):
+            key = row[id_index]
+            if key in seen:
+                continue  # same as the first row with this id, which wins
+            seen.add(key)
+            stamp = _utc(row[stamp_index]) if stamp_index is not None and row[stamp_index] else None
+            if stamp and (high_water is None or stamp > high_water):
+                high_water = stamp
+            previous = known.get(key)
+            # Bubble dates are to the minute, so a row dated in the mark's
+            # minute may have changed after the last export; hash it
+            if previous is not None and mark and stamp and stamp < mark:
+                continue
+            digest = int.from_bytes(hashlib.blake2b("\t".join(map(copy_value, row)).encode("utf-8"),
+                                                    digest_size=8).digest(), "big", signed=True)
+            if digest == previous:
+                continue
+            if previous is None:
+                new += 1
+            else:
+                changed += 1
+            updates[key] = digest
+            yield record
+
+        deleted = pending["deleted"] = [key for key in known if key not in seen]
+        pending["high_water"] = high_water
+        print(f"  Sync: {new} new, {changed} changed, {len(seen) - new - changed} unchanged, "
+              f"{len(deleted)} no longer in the export"
+              + (f" (high-water mark {high_water.isoformat()})" if high_water else ""))
+
+    def discard(self, table: str, record_id: str):
+        """Leave a rejected row out of the state so the next sync retries it."""
+        pending = self._pending.get(table)
+        if pending:
+            pending["updates"].pop(record_id, None)
+
+    def commit(self, table: str):
+        """Store a table's state once every change changed() yielded has been written."""
+        pending = self._pending.pop(table, None)
+        if pending is None:
+            return
+        filename, size, mtime_ns = self._stat(table)
+        for key in pending["deleted"]:
+            self.deletions.add(table, {"id": key}, f"not in {filename}")
+        high_water = pending["high_water"].isoformat() if pending["high_water"] else None
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO fingerprints (tbl, id, digest) VALUES (?, ?, ?)",
+                                  ((table, key, digest) for key, digest in pending["updates"].items()))
+            self.conn.executemany("DELETE FROM fingerprints WHERE tbl = ? AND id = ?",
+                                  ((table, key) for key in pending["deleted"]))
+            self.conn.execute("INSERT OR REPLACE INTO exports (tbl, filename, size, mtime_ns, user_map, high_water) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (table, filename, size, mtime_ns, self.user_map_digest, high_water))
+
+    def close(self):
+        self.conn.close()
+        self.deletions.close()
+        if self.deletions.total:
+            print(f"{self.deletions.total} rows missing from the newest exports written to: {self.deletions.path}")
+
+
+def _utc(value: datetime) -> datetime:
+    """Comparable form of a parsed date: naive dates are taken as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class MigrationMetrics:
+    """Per-table, per-stage instrumentation for a migration run.
+
+    Stages are read, transform, dedupe, write and commit. Each records its
+    wall time, row and byte counts and errors; writes also feed a batch
+    latency histogram. Generator stages are timed with timed(), which
+    subtracts the upstream stage's time so each stage reports only its own
+    work. Shared by all scheduler workers, so updates take a lock.
+    """
+
+    def __init__(self, progress: bool = False):
+        self.progress = progress
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.tables: dict[str, dict] = {}
+        self._inclusive: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def _table(self, table: str) -> dict:
+        return self.tables.setdefault(table, {
+            "stages": {},
+            "batch_latency_ms": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            "rows_written": 0,
+            "rows_rejected": 0,
+            "expected_rows": None,
+            "first_write": None,
+        })
+
+    def record(self, table: str, stage: str, seconds: float = 0.0, rows: int = 0,
+               nbytes: int = 0, errors: int = 0):
+        """Add one observation to a table stage."""
+        with self._lock:
+            stats = self._table(table)["stages"].setdefault(
+                stage, {"seconds": 0.0, "rows": 0, "bytes": 0, "errors": 0, "calls": 0}
+            )
+            stats["seconds"] += seconds
+            stats["rows"] += rows
+            stats["bytes"] += nbytes
+            stats["errors"] += errors
+            stats["calls"] += 1
+
+    @contextmanager
+    def timer(self, table: str, stage: str, rows: int = 0, nbytes: int = 0):
+        """Time a block of work as one call of a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(table, stage, time.perf_counter() - started, rows, nbytes)
+
+    def timed(self, table: str, stage: str, iterable: Iterable, upstream: Optional[str] = None) -> Iterator:
+        """Yield from `iterable`, recording time spent producing items.
+
+        Time spent in `upstream` (an inner timed() stage of the same table)
+        is subtracted so nested generator stages are not double counted.
+        """
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        total = 0.0
+        count = 0
+        try:
+            while True:
+                started = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    total += clock() - started
+                    break
+                total += clock() - started
+                count += 1
+                yield item
+        finally:
+            inner = self._inclusive.pop((table, upstream), 0.0) if upstream else 0.0
+            self._inclusive[(table, stage)] = total
+            self.record(table, stage, max(total - inner, 0.0), rows=count)
+
+    def batch_written(self, table: str, rows: int, seconds: float, nbytes: int = 0, errors: int = 0,
+                      rejected: int = 0):
+        """Record a sink write and refresh the live progress line."""
+        self.record(table, "write", seconds, rows, nbytes, errors)
+        milliseconds = seconds * 1000
+        bucket = next((i for i, limit in enumerate(LATENCY_BUCKETS_MS) if milliseconds <= limit),
+                      len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            info = self._table(table)
+            info["batch_latency_ms"][bucket] += 1
+            info["rows_written"] += rows
+            info["rows_rejected"] += rejected
+            if info["first_write"] is None:
+                info["first_write"] = time.perf_counter() - seconds
+            written, expected, first = info["rows_written"], info["expected_rows"], info["first_write"]
+        if self.progress:
+            self._print_progress(table, written, expected, first)
+
+    def expect(self, table: str, rows: int):
+        """Set the number of rows a table will write, enabling an ETA."""
+        with self._lock:
+            self._table(table)["expected_rows"] = rows
+
+    def _print_progress(self, table: str, written: int, expected: Optional[int], first: float):
+        elapsed = max(time.perf_counter() - first, 1e-9)
+        rate = written / elapsed
+        line = f"  {table}: {written:,}"
+        if expected:
+            remaining = max(expected - written, 0)
+            line += f"/{expected:,} rows  {rate:,.0f} rows/s  ETA {remaining / rate if rate else 0:.0f}s"
+        else:
+            line += f" rows  {rate:,.0f} rows/s"
+        sys.stderr.write(f"\r{line:<79}")
+        sys.stderr.flush()
+
+    def report(self) -> dict:
+        """Machine-readable summary of the run."""
+        with self._lock:
+            tables = {}
+            for table, info in self.tables.items():
+                tables[table] = {
+                    "rows_written": info["rows_written"],
+                    "rows_rejected": info["rows_rejected"],
+                    "errors": sum(s["errors"] for s in info["stages"].values()),
+                    "stages": {name: dict(stats, seconds=round(stats["seconds"], 6))
+                               for name, stats in info["stages"].items()},
+                    "batch_latency_ms": {
+                        (f"<={limit}" if i < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]}"): n
+                        for i, (limit, n) in enumerate(zip(LATENCY_BUCKETS_MS + [None], info["batch_latency_ms"]))
+                        if n
+                    },
+                }
+        return {
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(time.perf_counter() - self._started, 3),
+            "tables": tables,
+        }
+
+    def summary(self) -> list[str]:
+        """Human-readable per-table stage timings."""
+        lines = [f"{'table':<22}{'rows':>10}" + "".join(f"{stage:>11}" for stage in METRIC_STAGES)
+                 + f"{'errors':>8}"]
+        for table, info in self.report()["tables"].items():
+            stages = info["stages"]
+            lines.append(
+                f"{table:<22}{info['rows_written']:>10}"
+                + "".join(f"{stages[s]['seconds']:>10.2f}s" if s in stages else f"{'-':>11}"
+                          for s in METRIC_STAGES)
+                + f"{info['errors']:>8}"
+            )
+        return lines
+
+
+class TableCache:
+    """Per-run cache of parsed CSV exports.
+
+    Each export is decoded once and shared by every consumer (the username
+    scan and the table's migrate_* method). Entries are keyed by the file's
+    mtime and size so a replaced export is re-read, and are dropped as soon
+    as the last expected consumer releases them.
+    """
+
+    def __init__(self, consumers: Optional[dict[str, int]] = None):
+        self._tables: dict[str, tuple[tuple, list[dict]]] = {}
+        self._pending: dict[str, int] = dict(consumers or {})
+
+    def get(self, name: str) -> list[dict]:
+        """Return the parsed rows for a CSV_FILES entry."""
+        filename = CSV_FILES[name]
+        filepath = EXPORT_DIR / filename
+        try:
+            stat = filepath.stat()
+            key = (filename, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            key = (filename, None, None)
+
+        cached = self._tables.get(name)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        rows = read_csv(filename)
+        self._tables[name] = (key, rows)
+        return rows
+
+    def release(self, name: str):
+        """Mark one consumer of a table as finished."""
+        remaining = self._pending.get(name, 1) - 1
+        self._pending[name] = remaining
+        if remaining <= 0:
+            self._tables.pop(name, None)
+
+
+# Characters str.strip() removes, as an SQL literal, so btrim() trims the same
+_SQL_WHITESPACE = "E'" + "".join(f"\\u{ord(c):04x}" for c in map(chr, range(0x3001)) if c.isspace()) + "'"
+
+_SQL_MONTHS = "ARRAY[" + ", ".join(f"'{name}'" for name in _MONTHS) + "]"
+
+# _BUBBLE_DATE_RE and the datetime.fromisoformat() fallback as PostgreSQL
+# regexes. Postgres is slow at capturing groups inside optional groups, so a
+# Bubble date is matched without captures and its parts are then extracted
+# by three simpler patterns. The common "Jul 19, 2023 3:11 am" shape (with a
+# day every month has) skips all of that and goes straight to to_timestamp().
+_SQL_BUBBLE_DATE_FAST = (
+    r"^(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) ([1-9]|1[0-9]|2[0-8]), [1-9][0-9]{3} "
+    r"([1-9]|1[0-2]):[0-5][0-9] [ap]m$"
+)
+_SQL_BUBBLE_DATE_RE = (
+    r"^\s*[A-Za-z]{3}[A-Za-z]*\.?\s+[0-9]{1,2},\s*[0-9]{4}"
+    r"(?:\s+[0-9]{1,2}:[0-9]{2}(?::[0-9]{2})?\s*[AaPp][Mm])?"
+    r"(?:\s*(?:Z|UTC|GMT|[+-][0-9]{2}:?[0-9]{2}))?\s*$"
+)
+_SQL_BUBBLE_DAY_RE = r"^\s*([A-Za-z]{3})[A-Za-z]*\.?\s+([0-9]{1,2}),\s*([0-9]{4})"
+_SQL_BUBBLE_TIME_RE = r"([0-9]{1,2}):([0-9]{2})(?::([0-9]{2}))?\s*([AaPp])[Mm]"
+_SQL_BUBBLE_OFFSET_RE = r"(Z|UTC|GMT|[+-][0-9]{2}:?[0-9]{2})\s*$"
+_SQL_ISO_DATE_RE = (
+    r"^\s*([0-9]{4})-([0-9]{2})-([0-9]{2})"
+    r"(?:[T ]([0-9]{2}):([0-9]{2})(?::([0-9]{2})(?:\.([0-9]{1,6}))?)?)?"
+    r"(Z|[+-][0-9]{2}(?::?[0-9]{2})?)?\s*$"
+)
+
+
+def _sql_offset(match: str, group: int) -> str:
+    """Minutes east of UTC of a "Z"/"UTC"/"+02:00"/"-0500" regex group, NULL if absent."""
+    digits = f"replace({match}[{group}], ':', '')"
+    return (f"CASE WHEN {match}[{group}] IN ('Z', 'UTC', 'GMT') THEN 0 "
+            f"ELSE (CASE WHEN left({match}[{group}], 1) = '-' THEN -1 ELSE 1 END) "
+            f"* (substr({digits}, 2, 2)::int * 60 + coalesce(nullif(substr({digits}, 4, 2), '')::int, 0)) END")
+
+
+def _sql_timestamp(year: str, month: str, day: str, hour: str, minute: str, second: str, offset: str) -> str:
+    """timestamptz from parts, NULL wherever datetime() would raise.
+
+    Without an offset the value is naive and takes the session time zone,
+    as a naive datetime sent by the Python path does.
+    """
+    stamp = f"make_timestamp({year}, {month}, {day}, {hour}, {minute}, {second})"
+    return (
+        f"CASE WHEN {year} >= 1 AND {month} IS NOT NULL THEN CASE "
+        f"WHEN {day} BETWEEN 1 AND extract(day FROM make_date({year}, {month}, 1) + interval '1 month - 1 day') "
+        f"AND {hour} BETWEEN 0 AND 23 AND {minute} BETWEEN 0 AND 59 AND {second} >= 0 AND {second} < 60 THEN "
+        f"CASE WHEN {offset} IS NULL THEN {stamp}::timestamptz "
+        f"WHEN abs({offset}) < 1440 THEN ({stamp} - make_interval(mins => {offset})) AT TIME ZONE 'UTC' END "
+        f"END END"
+    )
+
+
+def sql_parse_date(expr: str) -> str:
+    """SQL equivalent of parse_date() over a text expression."""
+    bubble = _sql_timestamp(
+        "d[3]::int", f"array_position({_SQL_MONTHS}, lower(d[1]))", "d[2]::int",
+        "CASE WHEN t IS NULL THEN 0 WHEN t[1]::int BETWEEN 1 AND 12 "
+        "THEN t[1]::int % 12 + CASE WHEN t[4] IN ('p', 'P') THEN 12 ELSE 0 END END",
+        "coalesce(t[2]::int, 0)", "coalesce(t[3]::int, 0)", _sql_offset("z", 1),
+    )
+    iso = _sql_timestamp(
+        "i[1]::int", "CASE WHEN i[2]::int BETWEEN 1 AND 12 THEN i[2]::int END", "i[3]::int",
+        "coalesce(i[4]::int, 0)", "coalesce(i[5]::int, 0)",
+        "(coalesce(i[6], '0') || '.' || coalesce(i[7], '0'))::float8", _sql_offset("i", 8),
+    )
+    return (f"CASE WHEN {expr} ~ '{_SQL_BUBBLE_DATE_FAST}' THEN to_timestamp({expr}, 'Mon DD, YYYY HH12:MI AM') "
+            f"WHEN {expr} ~ '{_SQL_BUBBLE_DATE_RE}' THEN (SELECT {bubble} "
+            f"FROM regexp_match({expr}, '{_SQL_BUBBLE_DAY_RE}') AS d, regexp_match({expr}, '{_SQL_BUBBLE_TIME_RE}') AS t, "
+            f"regexp_match({expr}, '{_SQL_BUBBLE_OFFSET_RE}') AS z) "
+            f"ELSE (SELECT {iso} FROM regexp_match({expr}, '{_SQL_ISO_DATE_RE}') AS i) END")
+
+
+def push_down_select(table: str, fieldnames: list[str]) -> str:
+    """SQL computing a table's transformed rows from its raw export table.
+
+    Mirrors transform_<table> over _raw_<table> (text columns c0, c1, ...
+    in export order plus the 1-based row number `_row`): the same trimming,
+    date, array and boolean parsing, username lookups through
+    _pushdown_usernames, filters and dedupe, as one query Postgres can
+    parallelize. Selects TABLE_COLUMNS plus each row's 0-based `ordinal`.
+    """
+    position = {name: i for i, name in enumerate(fieldnames)}  # last wins, like DictReader
+    joins = []
+
+    def raw(name: str) -> str:
+        return f"r.c{position[name]}" if name in position else "''"
+
+    def strip(name: str) -> str:
+        return f"btrim({raw(name)}, {_SQL_WHITESPACE})"
+
+    def text(name: str, default: str = "NULL") -> str:
+        # Universal newlines: the Python path reads exports in text mode
+        value = f"regexp_replace({strip(name)}, E'\\r\\n?', E'\\n', 'g')"
+        return f"coalesce(nullif({value}, ''), {default})"
+
+    def date(name: str) -> str:
+        return sql_parse_date(raw(name))
+
+    def array(name: str) -> str:
+        return (f"coalesce((SELECT array_agg(btrim(item, {_SQL_WHITESPACE}) ORDER BY n) "
+                f"FROM unnest(string_to_array({raw(name)}, ',')) WITH ORDINALITY AS a(item, n) "
+                f"WHERE btrim(item, {_SQL_WHITESPACE}) <> ''), '{{}}')")
+
+    def user(name: str, stripped: bool = False) -> str:
+        # get_user_id(): blanks and the admin placeholder have no user
+        alias = f"u{len(joins)}"
+        value = strip(name) if stripped else raw(name)
+        joins.append(f"LEFT JOIN {PUSH_DOWN_USERNAMES} {alias} ON {alias}.username = {strip(name)} "
+                     f"AND {value} NOT IN ('', '(App admin)')")
+        return f"{alias}.id"
+
+    row_id = (f"uuid_generate_v5('{ID_NAMESPACE}', '{table}' || E'\\x1f' "
+              f"|| coalesce(nullif({raw('unique id')}, ''), '#' || (r._row - 1)))")
+
+    where = "TRUE"
+    if table == "user_links":
+        user_id = user("User")
+        columns = [row_id, user_id, text("Label", "'Link'"), strip("Link"),
+                   date("Creation Date"), date("Modified Date")]
+        where = f"{user_id} IS NOT NULL"
+    elif table == "projects":
+        order = strip("Order")
+        columns = [row_id, "NULL::uuid", text("Name", "'Untitled'"), text("Description"), text("Link"),
+                   text("Photo"), f"CASE WHEN {order} ~ '^[0-9]+$' THEN {order}::int ELSE 1 END",
+                   date("Creation Date"), date("Modified Date")]
+    elif table == "videos":
+        url = strip("URL")
+        url = (f"coalesce('https://www.youtube.com/watch?v=' "
+               f"|| substring({url} FROM 'youtube\\.com/embed/([^\"?[:space:]]+)'), {url})")
+        columns = [row_id, user("Creator"), url, date("Creation Date"), date("Modified Date")]
+        where = f"{url} <> ''"
+    elif table in ("likes", "met_ups"):
+        first, second = (user("Sender"), user("Receiver")) if table == "likes" else (user("Creator"), user("User 2"))
+        if table == "met_ups":
+            # Same pair order as comparing the UUID strings
+            first, second = f"least({first}, {second})", f"greatest({first}, {second})"
+        columns = [row_id, first, second, date("Creation Date")]
+        where = " AND ".join(f"u{i}.id IS NOT NULL" for i in range(2))
+    elif table in ("messages", "friend_testimonials"):
+        other = "Recipient" if table == "messages" else "Subject"
+        columns = [row_id, user("Creator"), user(other), text("Value"),
+                   date("Creation Date"), date("Modified Date")]
+        where = f"{text('Value')} IS NOT NULL"
+    elif table == "app_testimonials":
+        columns = [row_id, user("Creator"), text("Username"), text("Value"),
+                   date("Creation Date"), date("Modified Date")]
+        where = f"{text('Value')} IS NOT NULL"
+    elif table == "pairings":
+        # Match 2 falls back to the alternative name, like transform_pairings
+        match2 = f"coalesce({user('Match 2', True)}, {user('Match 2 Alt name', True)})"
+        columns = [row_id, user("Match 1 ", True), match2, text("Match 1 "), text("Match 2"),
+                   text("Match 2 Alt name"), text("Contact Info2"), text("Description"),
+                   array("Here for"), f"lower({raw('Anonymous')}) = 'yes'"]
+    else:
+        raise ValueError(f"No push-down transform for {table!r}")
+
+    select = ", ".join(f"{expr} AS {name}" for expr, name in zip(columns, TABLE_COLUMNS[table]))
+    query = (f"SELECT {select}, r._row - 1 AS ordinal FROM {PUSH_DOWN_RAW_PREFIX}{table} r "
+             f"{' '.join(joins)} WHERE {where}")
+    if table in DEDUPE_KEYS:
+        keys = ", ".join(DEDUPE_KEYS[table])
+        query = (f"SELECT * FROM (SELECT *, row_number() OVER (PARTITION BY {keys} ORDER BY ordinal) AS _n "
+                 f"FROM ({query}) t) d WHERE _n = 1")
+    return query
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def verify_digest(record: tuple, tz: timezone = timezone.utc) -> int:
+    """64-bit hash of a row for --verify; verify_hash_sql() computes the same in the database.
+
+    Every field is rendered as text and length-prefixed ("-" for NULL):
+    timestamps as microseconds since the epoch (naive ones in `tz`, the
+    server's time zone, as the database read them), arrays as JSON.
+    """
+    fields = []
+    for value in record:
+        if value is None:
+            fields.append("-")
+            continue
+        if isinstance(value, bool):
+            text = "true" if value else "false"
+        elif isinstance(value, datetime):
+            text = str(((value if value.tzinfo else value.replace(tzinfo=tz)) - _EPOCH) // _MICROSECOND)
+        elif isinstance(value, (list, tuple)):
+            text = json.dumps(list(value), ensure_ascii=False, separators=(",", ":"))
+        else:
+            text = str(value)
+        fields.append(f"{len(text)}:{text}")
+    digest = hashlib.md5("|".join(fields).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def verify_hash_sql(columns: Iterable[tuple[str, str]]) -> str:
+    """SQL expression for verify_digest() over (column, information_schema data_type) pairs."""
+    fields = []
+    for column, data_type in columns:
+        if data_type == "timestamp with time zone":
+            value = f"(extract(epoch FROM {column}) * 1000000)::bigint::text"
+        elif data_type == "ARRAY":
+            value = f"array_to_json({column})::text"
+        else:
+            value = f"{column}::text"
+        fields.append(f"coalesce(length({value}) || ':' || {value}, '-')")
+    row = " || '|' || ".join(fields)
+    return f"('x' || left(md5({row}), 16))::bit(64)::bigint"
+
+
+def verify_prefix(rows: int) -> int:
+    """Id prefix length giving buckets of about VERIFY_BUCKET_ROWS rows."""
+    prefix = 1
+    while prefix < VERIFY_PREFIX_MAX and 16 ** prefix * VERIFY_BUCKET_ROWS < rows:
+        prefix += 1
+    return prefix
+
+
+class Sink:
+    """Destination for transformed records.
+
+    Each worker calls connect() once, write() for every committed batch and
+    close() at the end; the username_map step calls resolve_usernames().
+    write() stores one batch and returns (bytes sent, failed batches),
+    passing rows it could not store to `on_reject(record, reason)`.
+    finish() runs once after every step succeeded.
+    """
+
+    adaptive = False  # sizes its own requests; --batch-size ROWS then doesn't set commit batches
+    durable = True  # keeps what it stores, so the run is checkpointed
+
+    def connect(self):
+        pass
+
+    def spawn(self) -> "Sink":
+        """Return a connected sink for another worker thread."""
+        raise NotImplementedError
+
+    def write(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+              on_reject=None) -> tuple[int, int]:
+        raise NotImplementedError
+
+    def resolve_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        """Store username placeholders and return the authoritative username->id map."""
+        raise NotImplementedError
+
+    def resume(self, table: str, offset: int):
+        """Called before a resumed run writes `table`; its first `offset` records were committed."""
+        pass
+
+    def finish(self, on_reject=None):
+        """Make everything written visible; `on_reject(table, record, reason)` gets late rejects."""
+        pass
+
+    def close(self):
+        pass
+
+
+class SupabaseSink(Sink):
+    """Supabase over the REST API: the httpx uploader, or supabase-py without httpx."""
+
+    adaptive = True
+
+    def __init__(self, concurrency: int = REST_CONCURRENCY, batcher_for=None):
+        self.concurrency = concurrency
+        self.batcher_for = batcher_for or (lambda table: AdaptiveBatcher())
+        self.supabase: Optional[Client] = None
+        self.uploader: Optional[RestUploader] = None
+
+    def connect(self):
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+        if HAS_SUPABASE:
+            self.supabase = create_client(url, key)
+        if HAS_HTTPX:
+            self.uploader = RestUploader(url, key, concurrency=self.concurrency)
+        print("Connected to Supabase")
+
+    def spawn(self) -> "SupabaseSink":
+        sink = SupabaseSink(self.concurrency, self.batcher_for)
+        sink.connect()
+        return sink
+
+    def write(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+              on_reject=None) -> tuple[int, int]:
+        batcher = self.batcher_for(table)
+        if self.uploader:
+            bytes_before, failed_before = self.uploader.bytes_sent, self.uploader.failed_batches
+            self.uploader.insert(table, records, batcher, on_reject=on_reject,
+                                 upsert=conflict == upsert_clause(table))
+            return self.uploader.bytes_sent - bytes_before, self.uploader.failed_batches - failed_before
+
+        nbytes = errors = 0
+        sized = ((row, len(json.dumps(row, default=_json_default)))
+                 for row in map(record_dict, records))
+        for batch in batcher.batches(sized, size=itemgetter(1)):
+            started = time.perf_counter()
+            stored = self._insert(table, [record for record, _ in batch], on_reject,
+                                  upsert=conflict == upsert_clause(table))
+            batcher.observe(len(batch), time.perf_counter() - started, errors=int(stored < len(batch)))
+            nbytes += sum(n for _, n in batch)
+            errors += int(stored == 0)
+        return nbytes, errors
+
+    def _insert(self, table: str, batch: list[dict], on_reject=None, upsert: bool = False) -> int:
+        """Insert (or upsert on id) a batch with supabase-py, bisecting it while rows are rejected."""
+        try:
+            query = self.supabase.table(table)
+            (query.upsert(batch, on_conflict="id") if upsert else query.insert(batch)).execute()
+            return len(batch)
+        except Exception as e:
+            if len(batch) > 1 and is_row_error(e):
+                half = len(batch) // 2
+                return (self._insert(table, batch[:half], on_reject, upsert)
+                        + self._insert(table, batch[half:], on_reject, upsert))
+            if not is_row_error(e):
+                print(f"  Error inserting into {table}: {e}")
+            if on_reject:
+                for record in batch:
+                    on_reject(record, str(e))
+            return 0
+
+    def resolve_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        # resolve_usernames() from resolve_usernames.sql runs RESOLVE_USERNAMES_SQL
+        params = {"usernames": list(user_map), "ids": list(user_map.values())}
+        if self.uploader:
+            return self.uploader.rpc("resolve_usernames", params) or {}
+        return self.supabase.rpc("resolve_usernames", params).execute().data or {}
+
+    def close(self):
+        if self.uploader:
+            self.uploader.close()
+
+
+class PostgresSink(Sink):
+    """Direct psycopg2 connection loading batches with COPY through a staging table."""
+
+    def __init__(self, metrics: Optional["MigrationMetrics"] = None):
+        self.metrics = metrics or MigrationMetrics()
+        self.conn = None
+        self.use_copy = True  # cleared if the server rejects COPY FROM STDIN
+        self.staged_usernames = False  # created PUSH_DOWN_USERNAMES, dropped on close
+
+    def connect(self):
+        db_url = os.environ.get("DATABASE_URL")
+        if not db_url:
+            raise ValueError("DATABASE_URL must be set for direct connection")
+        self.conn = psycopg2.connect(db_url)
+        print("Connected to PostgreSQL directly")
+
+    def spawn(self) -> "PostgresSink":
+        sink = type(self)(self.metrics)
+        sink.connect()
+        return sink
+
+    def write(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+              on_reject=None) -> tuple[int, int]:
+        try:
+            return self._bulk_load(table, records, conflict, on_reject), 0
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Lost connection: stop so the checkpoint isn't advanced past unsent rows
+            raise
+        except Exception as e:
+            self.conn.rollback()
+            print(f"  Error bulk loading {table}: {e}")
+            if on_reject:
+                for record in records:
+                    on_reject(record, str(e))
+            return 0, 1
+
+    def resolve_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        with self.conn.cursor() as cur:
+            cur.execute(RESOLVE_USERNAMES_SQL, (list(user_map), list(user_map.values())))
+            resolved = {username: str(user_id) for username, user_id in cur.fetchall()}
+        self.conn.commit()
+        return resolved
+
+    def stage_usernames(self, user_map: dict[str, str]):
+        """Store the username->id map server-side for push_down() lookups."""
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {PUSH_DOWN_USERNAMES}")
+            cur.execute(f"CREATE UNLOGGED TABLE {PUSH_DOWN_USERNAMES} (username TEXT PRIMARY KEY, id UUID NOT NULL)")
+            cur.copy_expert(f"COPY {PUSH_DOWN_USERNAMES} FROM STDIN", CopyStream(user_map.items()),
+                            size=COPY_BUFFER_SIZE)
+            cur.execute(f"ANALYZE {PUSH_DOWN_USERNAMES}")
+        self.conn.commit()
+        self.staged_usernames = True
+
+    def available_connections(self) -> int:
+        """Client connections the server can still accept."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT current_setting('max_connections')::int "
+                        "- current_setting('superuser_reserved_connections')::int "
+                        "- (SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'client backend')")
+            available = cur.fetchone()[0]
+        self.conn.rollback()
+        return available
+
+    def connection_pool(self, size: int) -> "ThreadedConnectionPool":
+        """Pool of up to `size` connections for load_partition()."""
+        return ThreadedConnectionPool(1, size, os.environ["DATABASE_URL"])
+
+    def load_partition(self, conn, table: str, batches: Iterable[list[tuple]], conflict: str = DEFAULT_CONFLICT,
+                       on_reject=None) -> int:
+        """Load a partition's batches over `conn` in one transaction and commit it.
+
+        Rows failing on a data or constraint error are bisected out to
+        `on_reject` as in write(); any other error rolls the whole partition
+        back and is raised. Returns the number of COPY bytes sent.
+        """
+        nbytes = 0
+        try:
+            with conn.cursor() as cur:
+                for records in batches:
+                    nbytes += self._load_bisect(cur, table, records, records[0]._fields, conflict, on_reject)
+            with self.metrics.timer(table, "commit"):
+                conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        return nbytes
+
+    def lookup_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        """resolve_usernames() without writing: usernames already in users map to their row's id."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT username, id::text FROM users WHERE username = ANY(%s)", (list(user_map),))
+            existing = dict(cur.fetchall())
+            cur.execute("SELECT id::text FROM users WHERE id = ANY(%s::uuid[])", (list(user_map.values()),))
+            ids = {user_id for user_id, in cur.fetchall()}
+        self.conn.rollback()
+        return {username: existing.get(username, user_id) for username, user_id in user_map.items()
+                if username in existing or user_id in ids}
+
+    def time_zone(self) -> timezone:
+        """The session time zone, in which the server reads naive timestamps."""
+        with self.conn.cursor() as cur:
+            cur.execute("SHOW TimeZone")
+            name = cur.fetchone()[0]
+        self.conn.rollback()
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            print(f"  Unknown server time zone {name!r}; comparing naive timestamps as UTC")
+            return timezone.utc
+
+    def verify_buckets(self, table: str, prefix: int) -> dict[str, tuple[int, int]]:
+        """Row count and sum of verify_digest() per id prefix, aggregated server-side."""
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT left(id::text, %s), count(*), sum(h) FROM "
+                        f"(SELECT id, {self._verify_hash(cur, table)} AS h FROM {table} "
+                        f"WHERE {VERIFY_FILTERS.get(table, 'true')}) t GROUP BY 1", (prefix,))
+            buckets = {bucket: (count, int(total)) for bucket, count, total in cur}
+        self.conn.rollback()
+        return buckets
+
+    def verify_rows(self, table: str, prefix: int, buckets: list[str]) -> dict[str, int]:
+        """verify_digest() of every row in the given id prefix buckets, by id."""
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT id::text, {self._verify_hash(cur, table)} FROM {table} "
+                        f"WHERE {VERIFY_FILTERS.get(table, 'true')} AND left(id::text, %s) = ANY(%s)",
+                        (prefix, buckets))
+            rows = dict(cur.fetchall())
+        self.conn.rollback()
+        return rows
+
+    @staticmethod
+    def _verify_hash(cur, table: str) -> str:
+        cur.execute("SELECT column_name, data_type FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = %s", (table,))
+        types = dict(cur.fetchall())
+        return verify_hash_sql((column, types.get(column, "text")) for column in TABLE_COLUMNS[table])
+
+    def push_down(self, table: str, filepath: Path, expected: Optional[Iterable[tuple]] = None,
+                  resolve_names=None) -> Optional[int]:
+        """Load a raw export and transform it into `table` inside the database.
+
+        The CSV is COPYed as-is into an UNLOGGED _raw_<table> table, turned
+        into rows by push_down_select() with one CREATE TABLE AS (which
+        Postgres can run with parallel workers) and inserted in export
+        order, all in one transaction. Names in its NAME_COLUMNS that are
+        not staged usernames are passed to `resolve_names` (a list of names
+        to a name -> id dict, see DataMigrator.resolve_names) and the ones
+        it resolves are staged first. With `expected`, the Python path's
+        rows for the table, both results are compared first and nothing is
+        written if they differ. Returns the number of rows, or None when the
+        table should go through the Python path instead.
+        """
+        with open_export(filepath) as f:
+            fieldnames = next(csv.reader(f), [])
+        if not fieldnames:
+            return None
+
+        raw = PUSH_DOWN_RAW_PREFIX + table
+        staged = PUSH_DOWN_PREFIX + table
+        target, conflict = self._target(table)
+        columns = ", ".join(TABLE_COLUMNS[table])
+        raw_columns = ", ".join(f"c{i}" for i in range(len(fieldnames)))
+        try:
+            with self.conn.cursor() as cur:
+                with self.metrics.timer(table, "read", nbytes=filepath.stat().st_size):
+                    cur.execute(f"CREATE UNLOGGED TABLE {raw} ("
+                                + "".join(f"c{i} TEXT, " for i in range(len(fieldnames)))
+                                + "_row BIGINT GENERATED ALWAYS AS IDENTITY)")
+                    with open_export(filepath, binary=True) as f:
+                        cur.copy_expert(f"COPY {raw} ({raw_columns}) FROM STDIN WITH (FORMAT csv, HEADER true, "
+                                        f"ENCODING 'UTF8', FORCE_NOT_NULL ({raw_columns}))", f, size=COPY_BUFFER_SIZE)
+                    cur.execute(f"ANALYZE {raw}")
+
+                with self.metrics.timer(table, "transform"):
+                    if resolve_names and table in NAME_COLUMNS:
+                        self._stage_names(cur, raw, fieldnames, NAME_COLUMNS[table], resolve_names)
+                    cur.execute(f"CREATE UNLOGGED TABLE {staged} AS {push_down_select(table, fieldnames)}")
+                    rows = cur.rowcount
+                if expected is not None and not self._matches(cur, table, staged, expected):
+                    self.conn.rollback()
+                    return None
+
+                started = time.perf_counter()
+                cur.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {staged} ORDER BY ordinal {conflict}")
+                cur.execute(f"DROP TABLE {staged}")
+                cur.execute(f"DROP TABLE {raw}")
+                self.metrics.batch_written(table, rows, time.perf_counter() - started)
+            with self.metrics.timer(table, "commit"):
+                self.conn.commit()
+            return rows
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            raise
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            print(f"  Push-down failed ({e.__class__.__name__}: {str(e).strip()}), using the Python transform")
+            return None
+
+    @staticmethod
+    def _stage_names(cur, raw: str, fieldnames: list[str], columns: tuple, resolve_names):
+        """Add the names in a raw export that resolve_names() matches to _pushdown_usernames."""
+        position = {name: i for i, name in enumerate(fieldnames)}
+        names = [f"btrim(c{position[column]}, {_SQL_WHITESPACE})" for column in columns if column in position]
+        if not names:
+            return
+        cur.execute(f"SELECT DISTINCT n FROM (SELECT unnest(ARRAY[{', '.join(names)}]) AS n FROM {raw}) t "
+                    f"WHERE n NOT IN ('', '(App admin)') AND NOT EXISTS "
+                    f"(SELECT 1 FROM {PUSH_DOWN_USERNAMES} u WHERE u.username = n)")
+        resolved = resolve_names([name for name, in cur.fetchall()])
+        if resolved:
+            # Sorted, so concurrent push-downs staging the same names cannot deadlock
+            cur.execute(f"INSERT INTO {PUSH_DOWN_USERNAMES} SELECT * FROM unnest(%s::text[], %s::uuid[]) "
+                        f"ORDER BY 1 ON CONFLICT DO NOTHING", (list(resolved), list(resolved.values())))
+
+    def _matches(self, cur, table: str, staged: str, expected: Iterable[tuple]) -> bool:
+        """Compare push-down rows with the Python path's, printing how they differ."""
+        check = f"{PUSH_DOWN_PREFIX}expected_{table}"
+        columns = ", ".join(TABLE_COLUMNS[table])
+        cur.execute(f"CREATE TEMP TABLE {check} (LIKE {table}) ON COMMIT DROP")
+        cur.copy_expert(f"COPY {check} ({columns}) FROM STDIN", CopyStream(expected), size=COPY_BUFFER_SIZE)
+        differences = []
+        for label, left, right in (("only in SQL", staged, check), ("only in Python", check, staged)):
+            cur.execute(f"SELECT count(*), (array_agg(id::text))[1:3] FROM "
+                        f"(SELECT {columns} FROM {left} EXCEPT ALL SELECT {columns} FROM {right}) d")
+            count, sample = cur.fetchone()
+            if count:
+                differences.append(f"{count} rows {label} (e.g. {', '.join(map(str, sample))})")
+        if differences:
+            print(f"  Push-down result differs from the Python transform: {'; '.join(differences)}")
+            return False
+        print("  Push-down result matches the Python transform")
+        return True
+
+    def _target(self, table: str) -> tuple[str, str]:
+        """Table push_down() inserts into, and its conflict clause."""
+        return table, CONFLICT_CLAUSES.get(table, DEFAULT_CONFLICT)
+
+    def close(self):
+        if self.conn and self.staged_usernames and not self.conn.closed:
+            try:
+                self.conn.rollback()
+                with self.conn.cursor() as cur:
+                    cur.execute(f"DROP TABLE IF EXISTS {PUSH_DOWN_USERNAMES}")
+                self.conn.commit()
+            except psycopg2.Error as e:
+                print(f"  Could not drop {PUSH_DOWN_USERNAMES}: {e}")
+        if self.conn:
+            self.conn.close()
+
+    def _bulk_load(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+                   on_reject=None) -> int:
+        """Bulk load records over the direct connection and commit.
+
+        Returns the number of COPY bytes sent (0 on the INSERT fallback).
+
+        Rows are streamed with COPY into a temporary staging table and then
+        merged with a single INSERT ... SELECT so the conflict clause still
+        applies. If the server rejects COPY as unsupported or not permitted
+        (COPY_UNSUPPORTED_CODES, e.g. behind a pooler that does not support
+        it) we fall back to multi-row execute_values inserts; any other
+        error fails the batch and leaves COPY on.
+        A batch failing on a data or constraint error is rolled back to its
+        savepoint and bisected until only the offending rows are left; those
+        go to `on_reject` and the rest commit in the same transaction.
+        """
+        columns = records[0]._fields
+        with self.conn.cursor() as cur:
+            nbytes = self._load_bisect(cur, table, records, columns, conflict, on_reject)
+        with self.metrics.timer(table, "commit"):
+            self.conn.commit()
+        return nbytes
+
+    def _load_bisect(self, cur, table: str, records: list[tuple], columns: list[str],
+                     conflict: str, on_reject=None) -> int:
+        try:
+            return self._load_batch(cur, table, records, columns, conflict)
+        except psycopg2.Error as e:
+            if not is_row_error(e):
+                raise
+            if len(records) == 1:
+                if on_reject:
+                    on_reject(records[0], f"{e.pgcode}: {e}")
+                return 0
+            half = len(records) // 2
+            return (self._load_bisect(cur, table, records[:half], columns, conflict, on_reject)
+                    + self._load_bisect(cur, table, records[half:], columns, conflict, on_reject))
+
+    def _load_batch(self, cur, table: str, records: list[tuple], columns: list[str], conflict: str) -> int:
+        """Load one batch inside a savepoint, rolling back to it if the batch fails."""
+        col_names = ", ".join(columns)
+        staging = f"_stage_{table}"
+
+        if self.use_copy:
+            cur.execute("SAVEPOINT bulk_load")
+            try:
+                cur.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)")
+                stream = CopyStream(records)
+                cur.copy_expert(f"COPY {staging} ({col_names}) FROM STDIN", stream, size=COPY_BUFFER_SIZE)
+                cur.execute(
+                    f"INSERT INTO {table} ({col_names}) SELECT {col_names} FROM {staging} {conflict}"
+                )
+                cur.execute(f"DROP TABLE {staging}")
+                cur.execute("RELEASE SAVEPOINT bulk_load")
+                return stream.bytes_read
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT bulk_load")
+                cur.execute("RELEASE SAVEPOINT bulk_load")
+                if e.pgcode not in COPY_UNSUPPORTED_CODES:
+                    raise
+                self.use_copy = False
+                print(f"  COPY unavailable ({e.__class__.__name__}), falling back to multi-row INSERT")
+
+        cur.execute("SAVEPOINT bulk_load")
+        try:
+            execute_values(
+                cur,
+                f"INSERT INTO {table} ({col_names}) VALUES %s {conflict}",
+                records,
+                page_size=INSERT_PAGE_SIZE,
+            )
+        except psycopg2.Error:
+            cur.execute("ROLLBACK TO SAVEPOINT bulk_load")
+            cur.execute("RELEASE SAVEPOINT bulk_load")
+            raise
+        cur.execute("RELEASE SAVEPOINT bulk_load")
+        return 0
+
+
+class FastLoadSink(PostgresSink):
+    """PostgresSink that stages tables and merges them in one transaction at the end.
+
+    Batches for every table referencing users are COPYed into UNLOGGED
+    `_fastload_<table>` tables that have no indexes or constraints besides
+    NOT NULL, so nothing is maintained row by row. users itself loads
+    directly because username resolution reads it back mid-run. finish()
+    then, in a single transaction, drops each table's secondary indexes and
+    foreign keys, rejects staged rows referencing missing users, merges the
+    rest with one INSERT ... SELECT, re-adds the foreign keys (validated in
+    one pass each) and rebuilds the indexes. Any failure rolls all of it
+    back, leaving the real tables and their indexes as they were.
+    Unlogged tables do not survive a crash, so these runs aren't checkpointed.
+    """
+
+    durable = False
+    staged = tuple(USER_REFERENCES)
+
+    def __init__(self, metrics: Optional["MigrationMetrics"] = None):
+        super().__init__(metrics)
+        self.owner = True  # creates the staging tables and drops them on close
+
+    def connect(self):
+        super().connect()
+        if not self.owner:
+            return
+        # Start from empty staging tables, even if an earlier run died mid-way
+        with self.conn.cursor() as cur:
+            for table in self.staged:
+                cur.execute(f"DROP TABLE IF EXISTS {FAST_LOAD_PREFIX}{table}")
+                cur.execute(f"CREATE UNLOGGED TABLE {FAST_LOAD_PREFIX}{table} (LIKE {table} INCLUDING DEFAULTS)")
+        self.conn.commit()
+
+    def spawn(self) -> "FastLoadSink":
+        sink = FastLoadSink(self.metrics)
+        sink.owner = False
+        sink.connect()
+        return sink
+
+    def _target(self, table: str) -> tuple[str, str]:
+        if table in self.staged:
+            return FAST_LOAD_PREFIX + table, ""
+        return super()._target(table)
+
+    def _load_batch(self, cur, table: str, records: list[tuple], columns: list[str], conflict: str) -> int:
+        if table not in self.staged:
+            return super()._load_batch(cur, table, records, columns, conflict)
+        staging = FAST_LOAD_PREFIX + table
+        if not self.use_copy:
+            return super()._load_batch(cur, staging, records, columns, "")
+
+        cur.execute("SAVEPOINT bulk_load")
+        try:
+            stream = CopyStream(records)
+            cur.copy_expert(f"COPY {staging} ({', '.join(columns)}) FROM STDIN", stream, size=COPY_BUFFER_SIZE)
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT bulk_load")
+            cur.execute("RELEASE SAVEPOINT bulk_load")
+            if e.pgcode not in COPY_UNSUPPORTED_CODES:
+                raise
+            # Let PostgresSink find out COPY is unavailable and INSERT instead
+            return super()._load_batch(cur, staging, records, columns, "")
+        cur.execute("RELEASE SAVEPOINT bulk_load")
+        return stream.bytes_read
+
+    def finish(self, on_reject=None):
+        print("\n=== Merging Staged Tables ===")
+        rejects = []
+        with self.conn.cursor() as cur:
+            try:
+                cur.execute(f"SET LOCAL maintenance_work_mem = '{FAST_LOAD_MAINTENANCE_MEM}'")
+                for table in self.staged:
+                    started = time.perf_counter()
+                    merged, rejected = self._merge(cur, table)
+                    self.metrics.record(table, "commit", time.perf_counter() - started, merged)
+                    rejects.extend((table, record) for record in rejected)
+                    print(f"  {table}: merged {merged} rows" + (f", rejected {len(rejected)}" if rejected else ""))
+                started = time.perf_counter()
+                self.conn.commit()
+                print(f"  Committed in {time.perf_counter() - started:.1f}s")
+            except Exception:
+                self.conn.rollback()
+                print("  Merge failed, rolled back; tables and indexes are unchanged")
+                raise
+        # Only report rows as rejected once the merge that dropped them is committed
+        if on_reject:
+            for table, record in rejects:
+                on_reject(table, record, "23503: referenced user does not exist")
+
+    def _merge(self, cur, table: str) -> tuple[int, list[dict]]:
+        """Move one staging table into place; returns (rows merged, rows rejected)."""
+        staging = FAST_LOAD_PREFIX + table
+        columns = ", ".join(TABLE_COLUMNS[table])
+
+        # Secondary indexes and foreign keys; unique indexes stay for ON CONFLICT
+        cur.execute(
+            """SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) FROM pg_index i
+               WHERE i.indrelid = %s::regclass AND NOT i.indisunique
+               AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)""",
+            (table,),
+        )
+        indexes = cur.fetchall()
+        cur.execute(
+            """SELECT quote_ident(conname), pg_get_constraintdef(oid) FROM pg_constraint
+               WHERE conrelid = %s::regclass AND contype = 'f'""",
+            (table,),
+        )
+        foreign_keys = cur.fetchall()
+        for name, _ in indexes:
+            cur.execute(f"DROP INDEX {name}")
+        for name, _ in foreign_keys:
+            cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+
+        # The row-by-row path rejects these on the foreign key; do it as one set
+        missing = " OR ".join(
+            f"(s.{column} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.{column}))"
+            for column in USER_REFERENCES[table]
+        )
+        cur.execute(f"DELETE FROM {staging} s WHERE {missing} RETURNING *")
+        names = [d[0] for d in cur.description]
+        rejected = [dict(zip(names, row)) for row in cur.fetchall()]
+
+        # Staging order is load order, so the first duplicate still wins
+        cur.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} ORDER BY ctid "
+                    f"{CONFLICT_CLAUSES.get(table, DEFAULT_CONFLICT)}")
+        merged = cur.rowcount
+
+        for name, definition in foreign_keys:
+            cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        for _, definition in indexes:
+            cur.execute(definition)
+        cur.execute(f"ANALYZE {table}")
+        cur.execute(f"DROP TABLE {staging}")
+        return merged, rejected
+
+    def close(self):
+        if self.owner and self.conn and not self.conn.closed:
+            try:
+                self.conn.rollback()
+                with self.conn.cursor() as cur:
+                    for table in self.staged:
+                        cur.execute(f"DROP TABLE IF EXISTS {FAST_LOAD_PREFIX}{table}")
+                self.conn.commit()
+            except psycopg2.Error as e:
+                print(f"  Could not drop staging tables: {e}")
+        super().close()
+
+
+class SharedSink(Sink):
+    """Local sink that every worker writes through.
+
+    spawn() hands out the same instance and only the last close() releases
+    it; writes are serialised with a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refs = 1
+
+    def spawn(self) -> "SharedSink":
+        with self._lock:
+            self._refs += 1
+        return self
+
+    def close(self):
+        with self._lock:
+            self._refs -= 1
+            if self._refs == 0:
+                self._release()
+
+    def _release(self):
+        pass
+
+
+class FileSink(SharedSink):
+    """Per-table COPY text or INSERT files plus a load.sql, as a live run would write them.
+
+    Unlike --sql-only this goes through the normal pipeline, so batches are
+    checkpointed and rows are appended as they are committed. With `append`
+    (a resumed run) existing files are extended rather than truncated, after
+    resume() cuts COPY files back to their checkpointed rows; INSERT files
+    skip replayed rows through their conflict clauses. load.sql lists every
+    table file in the directory, including those of earlier runs.
+    """
 
-# Try to import supabase client
-try:
-    from supabase import create_client, Client
-    HAS_SUPABASE = True
-except ImportError:
-    HAS_SUPABASE = False
+    def __init__(self, directory: Optional[Path] = None, fmt: str = "copy", append: bool = False):
+        super().__init__()
+        self.directory = directory or DUMP_DIR
+        self.fmt = fmt
+        self.append = append
+        self._files: dict[str, tuple] = {}  # table -> (file, filename, columns, fmt)
 
-# Try to import psycopg2 for direct connection
-try:
-    import psycopg2
-    from psycopg2.extras import execute_values
-    HAS_PSYCOPG2 = True
-except ImportError:
-    HAS_PSYCOPG2 = False
+    def connect(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self.append:
+            # load.sql lists every table file here; start without an earlier run's
+            for path in [*self.directory.glob("*.copy"), *self.directory.glob("*.sql")]:
+                if path.stem in TABLE_COLUMNS or path.stem == "usernames":
+                    path.unlink()
+        print(f"Writing {self.fmt.upper()} files to {self.directory}")
 
+    def write(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+              on_reject=None) -> tuple[int, int]:
+        return self._write(table, table, records, self.fmt, conflict), 0
 
-EXPORT_DIR = Path(__file__).parent.parent / "bubble-exports"
+    def _write(self, key: str, table: str, records: list[tuple], fmt: str, conflict: str) -> int:
+        with self._lock:
+            if key not in self._files:
+                filename = f"{key}.{'copy' if fmt == 'copy' else 'sql'}"
+                mode = "a" if self.append else "w"
+                handle = open(self.directory / filename, mode, encoding="utf-8", newline="")
+                self._files[key] = (handle, filename, records[0]._fields, fmt)
+            handle, _, columns, _ = self._files[key]
+            text = dump_text(table, records, columns, fmt, conflict)
+            handle.write(text)
+            handle.flush()
+        return len(text)
 
-# CSV file mapping
-CSV_FILES = {
-    "users": "export_All-Users_2026-01-21_02-10-40.csv",
-    "messages": "export_All-Messages_2026-01-21_02-10-58.csv",
-    "likes": "export_All-Likes_2026-01-21_02-12-18.csv",
-    "friend_testimonials": "export_All-FriendTestimonials_2026-01-21_02-12-03.csv",
-    "app_testimonials": "export_All-AppTestimonials_2026-01-21_02-15-32.csv",
-    "met_ups": "export_All-Met-Ups_2026-01-21_02-11-44.csv",
-    "projects": "export_All-Projects_2026-01-21_02-12-51.csv",
-    "user_links": "export_All-UserLinks_2026-01-21_02-13-02.csv",
-    "videos": "export_All-Videos_2026-01-21_02-13-13.csv",
-    "pairings": "export_All-Pairings_2026-01-21_02-12-42.csv",
-}
+    def resolve_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        # Always INSERTs: names of email users must update existing rows
+        records = [UsernameRow(user_id, username) for username, user_id in user_map.items()]
+        if records:
+            self._write("usernames", "users", records, "insert", USERNAME_UPSERT)
+        return dict(user_map)
 
+    def resume(self, table: str, offset: int):
+        # A COPY file has one line per record; drop those written after the
+        # last checkpoint, which the resumed run writes again
+        path = self.directory / f"{table}.copy"
+        if self.fmt != "copy" or not path.exists():
+            return
+        with self._lock, open(path, "rb+") as f:
+            for _ in range(offset):
+                if not f.readline():
+                    break
+            if f.tell() < os.fstat(f.fileno()).st_size:
+                f.truncate(f.tell())
+                print(f"  Dropped rows of {path.name} written after the checkpoint")
 
-def parse_date(date_str: str) -> Optional[datetime]:
-    """Parse Bubble date format to datetime."""
-    if not date_str:
-        return None
-    try:
-        # Format: "Jul 19, 2023 3:11 am"
-        return datetime.strptime(date_str, "%b %d, %Y %I:%M %p")
-    except ValueError:
-        try:
-            # Try alternate format
-            return datetime.strptime(date_str, "%b %d, %Y %I:%M %p")
-        except ValueError:
-            return None
+    def _release(self):
+        for handle, *_ in self._files.values():
+            handle.close()
+        self._files.clear()
+        # In load order: users, their usernames, then the other tables
+        keys = ["users", "usernames", *(step for step in MIGRATION_STEPS if step not in ("users", "username_map"))]
+        with open(self.directory / "load.sql", "w", encoding="utf-8") as f:
+            f.write("-- Cuties App data written by migrate_data.py --sink file\n")
+            f.write("-- Load from this directory with: psql \"$DATABASE_URL\" -f load.sql\n\n")
+            for key in keys:
+                table = "users" if key == "usernames" else key
+                columns = UsernameRow._fields if key == "usernames" else TABLE_COLUMNS[table]
+                for fmt, ext in (("copy", "copy"), ("insert", "sql")):
+                    if (self.directory / f"{key}.{ext}").exists():
+                        f.write(_load_command(table, f"{key}.{ext}", list(columns), fmt) + "\n")
 
 
-def parse_array(value: str) -> list:
-    """Parse comma-separated string to array."""
-    if not value:
-        return []
-    return [item.strip() for item in value.split(",") if item.strip()]
+class SQLiteSink(SharedSink):
+    """Local SQLite database, for offline runs that should still be queryable.
 
+    Tables are created from the first batch's columns. The id primary key
+    and DEDUPE_KEYS unique constraints stand in for the PostgreSQL conflict
+    targets, with INSERT OR IGNORE in place of ON CONFLICT DO NOTHING;
+    --sync upserts (upsert_clause) run as written. Arrays are stored as
+    JSON text.
+    """
 
-def parse_bool(value: str) -> bool:
-    """Parse yes/no to boolean."""
-    return value.lower() == "yes" if value else False
+    def __init__(self, path: Optional[Path] = None):
+        super().__init__()
+        self.path = path or EXPORT_DIR / "migration.sqlite3"
+        self.conn: Optional[sqlite3.Connection] = None
+        self._columns: dict[str, list[str]] = {}
 
+    def connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        print(f"Connected to SQLite database {self.path}")
 
-def read_csv(filename: str) -> list[dict]:
-    """Read CSV file and return list of dictionaries."""
-    filepath = EXPORT_DIR / filename
-    if not filepath.exists():
-        print(f"Warning: {filepath} not found")
-        return []
+    def _create(self, table: str, columns: Iterable[str]):
+        keys = [*(["PRIMARY KEY (id)"] if "id" in columns else []),
+                *([f"UNIQUE ({', '.join(DEDUPE_KEYS[table])})"] if table in DEDUPE_KEYS else [])]
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join([*columns, *keys])})")
+        self._columns[table] = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value, default=_json_default)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def write(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+              on_reject=None) -> tuple[int, int]:
+        columns = records[0]._fields
+        placeholders = ", ".join("?" * len(columns))
+        if conflict == upsert_clause(table):
+            statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) {conflict}"
+        else:
+            statement = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        with self._lock:
+            if table not in self._columns:
+                self._create(table, columns)
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        statement,
+                        (tuple(map(self._value, record)) for record in records),
+                    )
+            except sqlite3.Error as e:
+                print(f"  Error inserting into {table}: {e}")
+                if on_reject:
+                    for record in records:
+                        on_reject(record, str(e))
+                return 0, 1
+        return 0, 0
+
+    def resolve_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        """Same semantics as RESOLVE_USERNAMES_SQL: existing usernames keep their ids."""
+        with self._lock, self.conn:
+            if "users" not in self._columns:
+                self._create("users", ["id", "email", "username"])
+            elif "username" not in self._columns["users"]:
+                self.conn.execute("ALTER TABLE users ADD COLUMN username")
+                self._columns["users"].append("username")
+            existing = dict(self.conn.execute("SELECT username, id FROM users WHERE username IS NOT NULL"))
+            self.conn.executemany(
+                f"INSERT INTO users (id, username) VALUES (?, ?) {USERNAME_UPSERT}",
+                ((user_id, username) for username, user_id in user_map.items() if username not in existing),
+            )
+        return {username: existing.get(username, user_id) for username, user_id in user_map.items()}
+
+    def _release(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+
+class MemorySink(SharedSink):
+    """In-process sink for dry runs, benchmarks and offline profiling.
+
+    Counts rows per table and optionally keeps them (`keep`), COPY-encodes
+    them to measure output bytes (`encode`) and validates them (`validate`):
+    ids must be unique UUIDs, every *_id column must reference a user id
+    seen so far (USER_REFERENCES), and users need an email. Invalid rows are rejected with
+    the reason, so a dry run's dead-letter file lists every problem.
+    """
+
+    durable = False
+
+    def __init__(self, keep: bool = False, encode: bool = False, validate: bool = False):
+        super().__init__()
+        self.keep = keep
+        self.encode = encode
+        self.validate = validate
+        self.rows: dict[str, list[tuple]] = {}
+        self.counts: dict[str, int] = {}
+        self.bytes_written = 0
+        self._ids: dict[str, set[str]] = {}
+        self._usernames: dict[str, str] = {}
+
+    def connect(self):
+        print("Dry run: writing to memory" + (" and validating rows" if self.validate else ""))
 
-    with open(filepath, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+    def write(self, table: str, records: list[tuple], conflict: str = DEFAULT_CONFLICT,
+              on_reject=None) -> tuple[int, int]:
+        nbytes = 0
+        if self.encode:
+            stream = CopyStream(records)
+            while chunk := stream.read(COPY_BUFFER_SIZE):
+                nbytes += len(chunk)
+        with self._lock:
+            if self.validate:
+                records = [record for record in records if self._check(table, record, on_reject)]
+            self.counts[table] = self.counts.get(table, 0) + len(records)
+            self.bytes_written += nbytes
+            if self.keep:
+                self.rows.setdefault(table, []).extend(records)
+            if table == "users":
+                self._usernames.update((r.username, r.id) for r in records if getattr(r, "username", None))
+        return nbytes, 0
+
+    def _check(self, table: str, record: dict, on_reject=None) -> bool:
+        problem = None
+        ids = self._ids.setdefault(table, set())
+        users = self._ids.get("users", set())
+        for column in ("id", *USER_REFERENCES.get(table, ())):
+            value = getattr(record, column)
+            if value is None:
+                continue
+            try:
+                uuid.UUID(value)
+            except (TypeError, ValueError, AttributeError):
+                problem = f"{column} is not a UUID: {value!r}"
+                break
+            if column != "id" and value not in users:
+                problem = f"{column} references unknown user {value}"
+                break
+        if problem is None and record.id in ids:
+            problem = f"duplicate id {record.id}"
+        if problem is None and table == "users" and not record.email:
+            problem = "missing email"
+        if problem:
+            if on_reject:
+                on_reject(record, problem)
+            return False
+        ids.add(record.id)
+        return True
+
+    def resolve_usernames(self, user_map: dict[str, str]) -> dict[str, str]:
+        with self._lock:
+            resolved = {username: self._usernames.get(username, user_id) for username, user_id in user_map.items()}
+            self._ids.setdefault("users", set()).update(resolved.values())
+        return resolved
+
+
+SINKS = {
+    "supabase": SupabaseSink,
+    "postgres": PostgresSink,
+    "file": FileSink,
+    "sqlite": SQLiteSink,
+    "memory": MemorySink,
+}
 
 
 class DataMigrator:
-    def __init__(self, use_supabase: bool = True):
+    def __init__(self, use_supabase: bool = True, stream: bool = False, in_flight: int = 1000,
+                 concurrency: int = REST_CONCURRENCY, commit_every: int = COMMIT_EVERY,
+                 batch_rows: Optional[dict[str, int]] = None, batch_bytes: Optional[dict[str, int]] = None,
+                 sink: Optional[str] = None, sink_path: Optional[Path] = None, transform_workers: int = 1,
+                 fast_load: bool = False, push_down: bool = False, verify_push_down: bool = False,
+                 loaders: int = 0, name_aliases: Optional[Path] = None, partitions: int = 0):
         self.use_supabase = use_supabase
-        self.supabase: Optional[Client] = None
-        self.conn = None
-        self.user_map: dict[str, str] = {}  # username -> uuid
-        self.email_map: dict[str, str] = {}  # email -> uuid
+        self.sink_name = sink or ("supabase" if use_supabase else "postgres")  # a SINKS key
+        self.sink_path = sink_path  # file sink directory or SQLite database
+        self.sink: Optional[Sink] = None
+        self.fast_load = fast_load  # postgres sink: stage unindexed, merge and reindex at the end
+        self.push_down = push_down or verify_push_down  # postgres sink: transform raw exports in SQL
+        self.verify_push_down = verify_push_down  # compare each push-down with the Python transform
+        self.resume = False
+        self.stream = stream  # bounded-memory generator pipeline instead of whole-table lists
+        self.in_flight = in_flight  # max transformed rows held at once when streaming
+        self.commit_every = commit_every  # rows per committed batch on the in-memory path
+        self.transform_workers = transform_workers  # processes parsing/transforming large exports
+        self.loaders = loaders  # threads writing a table's batches while it is transformed (0: in turn)
+        self.partitions = partitions  # postgres sink: connections loading one large table at once
+        self.checkpoint = Checkpoint()  # in-memory unless run_migration opens a manifest
+        self.sync: Optional[SyncState] = None  # set by run_migration(sync=True)
+        self.read_only = False  # --verify: resolve usernames without writing placeholders
+        self.metrics = MigrationMetrics()
+        self.dead_letters = DeadLetters(EXPORT_DIR / DEAD_LETTER_FILE)
+        self.concurrency = concurrency  # max concurrent REST requests per worker
+        # Per-table overrides ("*" = every table): fixed rows per request or
+        # COPY batch, and the encoded byte budget per REST request
+        self.batch_rows = batch_rows or {}
+        self.batch_bytes = batch_bytes or {}
+        self.batchers: dict[str, AdaptiveBatcher] = {}
+        self.user_ids = UserIds()
+        self.user_map: dict[str, int] = {}  # username -> user handle
+        self.email_map: dict[str, int] = {}  # email -> user handle
+        self.name_aliases = name_aliases  # alias,username CSV (default: NAME_ALIASES_FILE if present)
+        self.names = NameIndex(self.user_map)  # get_user_id() lookups, indexed by build_username_map
+        # Tables scanned for usernames are read twice per run, everything else once
+        self.tables = TableCache({name: 2 for name in USERNAME_COLUMNS})
 
     def connect(self):
-        """Establish database connection."""
-        if self.use_supabase and HAS_SUPABASE:
-            url = os.environ.get("SUPABASE_URL")
-            key = os.environ.get("SUPABASE_KEY")
-            if not url or not key:
-                raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
-            self.supabase = create_client(url, key)
-            print("Connected to Supabase")
-        elif HAS_PSYCOPG2:
-            db_url = os.environ.get("DATABASE_URL")
-            if not db_url:
-                raise ValueError("DATABASE_URL must be set for direct connection")
-            self.conn = psycopg2.connect(db_url)
-            print("Connected to PostgreSQL directly")
-        else:
+        """Create and connect the sink this run writes to."""
+        name = self.sink_name
+        if name == "supabase" and not (HAS_SUPABASE or HAS_HTTPX) and HAS_PSYCOPG2:
+            name = "postgres"
+        if name == "supabase" and not (HAS_SUPABASE or HAS_HTTPX) or name == "postgres" and not HAS_PSYCOPG2:
             raise RuntimeError("No database client available. Install supabase or psycopg2")
 
+        if name == "supabase":
+            self.sink = SupabaseSink(self.concurrency, self._batcher)
+        elif name == "postgres":
+            self.sink = (FastLoadSink if self.fast_load else PostgresSink)(self.metrics)
+        elif name == "file":
+            self.sink = FileSink(self.sink_path, append=self.resume)
+        elif name == "sqlite":
+            self.sink = SQLiteSink(self.sink_path)
+        elif name == "memory":
+            self.sink = MemorySink(validate=True)
+        else:
+            raise ValueError(f"Unknown sink {name!r}; expected one of {', '.join(SINKS)}")
+        if self.push_down and name != "postgres":
+            raise RuntimeError("--push-down needs a direct PostgreSQL connection (--direct)")
+        self.sink.connect()
+
     def close(self):
-        """Close database connection."""
-        if self.conn:
-            self.conn.close()
+        """Close the sink."""
+        if self.sink:
+            self.sink.close()
 
-    def migrate_users(self) -> dict[str, str]:
-        """Migrate users table and build username->uuid mapping."""
-        print("\n=== Migrating Users ===")
-        rows = read_csv(CSV_FILES["users"])
-        print(f"Found {len(rows)} user records")
+    def migrate_users(self) -> dict[str, int]:
+        """Migrate users table and build email->uuid mapping."""
+        self._migrate_table("users", replay=True)
+        return self.email_map
 
-        users_data = []
+    def transform_users(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        """Transform Bubble user rows, recording each new id in email_map (and user_map by Name)."""
         for row in rows:
             email = row.get("email", "").strip()
             if not email:
                 continue
 
-            user_id = str(uuid.uuid4())
-            self.email_map[email] = user_id
-
-            users_data.append({
-                "id": user_id,
-                "bubble_id": row.get("Additional Links", "").strip() or None,
-                "email": email,
-                "age": int(row["Age"]) if row.get("Age", "").strip().isdigit() else None,
-                "short_description": row.get("shortdescription", "").strip() or None,
-                "background_color": row.get("Background Color", "").strip() or None,
-                "consent": parse_bool(row.get("consent", "")),
-                "collaborators": parse_array(row.get("Collabs", "")),
-                "communities": parse_array(row.get("Communities", "")),
-            })
-
-        if self.supabase:
-            # Batch insert
-            batch_size = 100
-            for i in range(0, len(users_data), batch_size):
-                batch = users_data[i:i + batch_size]
-                self.supabase.table("users").insert(batch).execute()
-                print(f"  Inserted users {i + 1} to {min(i + batch_size, len(users_data))}")
-        elif self.conn:
-            with self.conn.cursor() as cur:
-                for user in users_data:
-                    cur.execute("""
-                        INSERT INTO users (id, bubble_id, email, age, short_description,
-                                          background_color, consent, collaborators, communities)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (email) DO NOTHING
-                    """, (
-                        user["id"], user["bubble_id"], user["email"], user["age"],
-                        user["short_description"], user["background_color"], user["consent"],
-                        user["collaborators"], user["communities"]
-                    ))
-            self.conn.commit()
+            user_id = stable_id("users", email)
+            first_seen = email not in self.email_map
+            self.email_map[email] = self.user_ids.intern(user_id)
 
-        print(f"  Migrated {len(users_data)} users")
-        return self.email_map
+            # Newer exports carry the display name other tables reference
+            # users by; point it at this user instead of a placeholder.
+            name = row.get("Name", "").strip()
+            if first_seen and name and name not in self.user_map:
+                self.user_map[name] = self.email_map[email]
+
+            yield ROW_TYPES["users"](
+                id=user_id,
+                bubble_id=row.get("Additional Links", "").strip() or None,
+                email=email,
+                age=int(row["Age"]) if row.get("Age", "").strip().isdigit() else None,
+                short_description=row.get("shortdescription", "").strip() or None,
+                background_color=row.get("Background Color", "").strip() or None,
+                consent=parse_bool(row.get("consent", "")),
+                collaborators=parse_array(row.get("Collabs", "")),
+                communities=parse_array(row.get("Communities", "")),
+            )
 
     def build_username_map(self):
         """Build username to UUID mapping from various tables."""
         print("\n=== Building Username Map ===")
 
-        # Collect usernames from various tables
+        # Collect usernames from the tables that reference users by name
         usernames = set()
-
-        # From messages (Creator, Recipient)
-        for row in read_csv(CSV_FILES["messages"]):
-            if row.get("Creator"):
-                usernames.add(row["Creator"].strip())
-            if row.get("Recipient"):
-                usernames.add(row["Recipient"].strip())
-
-        # From likes (Sender, Receiver)
-        for row in read_csv(CSV_FILES["likes"]):
-            if row.get("Sender"):
-                usernames.add(row["Sender"].strip())
-            if row.get("Receiver"):
-                usernames.add(row["Receiver"].strip())
-
-        # From friend testimonials
-        for row in read_csv(CSV_FILES["friend_testimonials"]):
-            if row.get("Creator"):
-                usernames.add(row["Creator"].strip())
-            if row.get("Subject"):
-                usernames.add(row["Subject"].strip())
-
-        # From met_ups
-        for row in read_csv(CSV_FILES["met_ups"]):
-            if row.get("Creator"):
-                usernames.add(row["Creator"].strip())
-            if row.get("User 2"):
-                usernames.add(row["User 2"].strip())
-
-        # From user_links
-        for row in read_csv(CSV_FILES["user_links"]):
-            if row.get("User"):
-                usernames.add(row["User"].strip())
-
-        # From videos
-        for row in read_csv(CSV_FILES["videos"]):
-            if row.get("Creator"):
-                usernames.add(row["Creator"].strip())
+        with self.metrics.timer("username_map", "read"):
+            for name, columns in USERNAME_COLUMNS.items():
+                for row in self._read_rows(name):
+                    for column in columns:
+                        if row.get(column):
+                            usernames.add(row[column].strip())
+                self.tables.release(name)
 
         # Remove empty strings and admin entries
-        usernames = {u for u in usernames if u and u != "(App admin)"}
+        usernames = {u for u in usernames if u and normalize_name(u) != ADMIN_NAME_KEY}
 
         print(f"Found {len(usernames)} unique usernames")
 
-        # Create UUID for each username (or lookup if user exists)
+        # Derive a stable UUID for each username so re-runs line up
         for username in usernames:
             if username not in self.user_map:
-                self.user_map[username] = str(uuid.uuid4())
+                self.user_map[username] = self.user_ids.intern(stable_id("username", username))
 
-        # Update users table with usernames where possible
-        if self.supabase:
-            for username, user_id in self.user_map.items():
-                # Check if user already exists (we'd need to match by some criteria)
-                # For now, create placeholder users for usernames not in email list
-                pass
-        elif self.conn:
-            with self.conn.cursor() as cur:
-                for username, user_id in self.user_map.items():
-                    # Try to update existing user or insert new
-                    cur.execute("""
-                        INSERT INTO users (id, username)
-                        VALUES (%s, %s)
-                        ON CONFLICT (id) DO UPDATE SET username = EXCLUDED.username
-                    """, (user_id, username))
-            self.conn.commit()
+        # Resolve every username against the users table in one round trip;
+        # the server's ids win for usernames that already exist.
+        if self.sink:
+            started = time.perf_counter()
+            if self.read_only:
+                resolved = self.sink.lookup_usernames(self.username_ids())
+            else:
+                resolved = self.sink.resolve_usernames(self.username_ids())
+            changed = 0
+            for name, user_id in resolved.items():
+                handle = self.user_ids.intern(user_id)
+                changed += self.user_map.get(name) != handle
+                self.user_map[name] = handle
+            # Usernames with no users row stay unmapped; rows naming them are skipped
+            unmapped = [name for name in self.user_map if name not in resolved]
+            for name in unmapped:
+                del self.user_map[name]
+            self.metrics.batch_written("username_map", len(resolved), time.perf_counter() - started)
+            print(f"  Resolved {len(resolved)} usernames ({changed} matched existing users"
+                  + (f", {len(unmapped)} match no user" if unmapped else "") + ")")
+
+        # Index the final map for the names get_user_id() misses
+        aliases = self._load_name_aliases()
+        unknown = self.names.rebuild(aliases, self.email_map)
+        if unknown:
+            print(f"  {unknown} of {len(aliases)} name aliases point at no known user")
+        if self.sink and self.push_down:
+            self.sink.stage_usernames(self.username_ids())
+        if self.sync:
+            self.sync.note_user_map(self.username_ids(), aliases)
 
+        self.checkpoint.mark_done("username_map")
         return self.user_map
 
-    def get_user_id(self, username: str) -> Optional[str]:
-        """Get user UUID from username."""
-        if not username or username == "(App admin)":
+    def username_ids(self) -> dict[str, str]:
+        """user_map with UUID strings in place of handles."""
+        uuids = self.user_ids.uuids
+        return {username: uuids[handle] for username, handle in self.user_map.items()}
+
+    def _load_name_aliases(self) -> dict[str, str]:
+        path = self.name_aliases or EXPORT_DIR / NAME_ALIASES_FILE
+        if not path.exists():
+            return {}
+        aliases = load_name_aliases(path)
+        print(f"Loaded {len(aliases)} name aliases from {path.name}")
+        return aliases
+
+    def resolve_names(self, names: list[str]) -> dict[str, str]:
+        """UUIDs of the names get_user_id() resolves, for push-down lookups."""
+        uuids = self.user_ids.uuids
+        handles = ((name, self.get_user_id(name)) for name in names)
+        return {name: uuids[handle] for name, handle in handles if handle is not None}
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        """Get the user handle for a username (see UserIds and NameIndex)."""
+        if not username:
             return None
         username = username.strip()
-        return self.user_map.get(username)
+        handle = self.user_map.get(username)
+        if handle is None and username and normalize_name(username) != ADMIN_NAME_KEY:
+            handle = self.names.lookup(username)
+        return handle
 
     def migrate_user_links(self):
         """Migrate user links table."""
-        print("\n=== Migrating User Links ===")
-        rows = read_csv(CSV_FILES["user_links"])
-        print(f"Found {len(rows)} user link records")
+        self._migrate_table("user_links")
 
-        links_data = []
-        for row in rows:
+    def transform_user_links(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             user_id = self.get_user_id(row.get("User", ""))
             if not user_id:
                 continue
 
-            links_data.append({
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "label": row.get("Label", "").strip() or "Link",
-                "url": row.get("Link", "").strip(),
-                "created_at": parse_date(row.get("Creation Date", "")),
-                "updated_at": parse_date(row.get("Modified Date", "")),
-            })
-
-        self._insert_records("user_links", links_data)
-        print(f"  Migrated {len(links_data)} user links")
+            yield ROW_TYPES["user_links"](
+                id=row_id("user_links", row, ordinal),
+                user_id=user_id,
+                label=row.get("Label", "").strip() or "Link",
+                url=row.get("Link", "").strip(),
+                created_at=parse_date(row.get("Creation Date", "")),
+                updated_at=parse_date(row.get("Modified Date", "")),
+            )
 
     def migrate_projects(self):
         """Migrate projects table."""
-        print("\n=== Migrating Projects ===")
-        rows = read_csv(CSV_FILES["projects"])
-        print(f"Found {len(rows)} project records")
+        self._migrate_table("projects")
 
+    def transform_projects(self, rows: Iterable[dict]) -> Iterator[tuple]:
         # Projects don't have a direct user reference in the export
         # We'll need to link them later or skip user_id for now
-        projects_data = []
-        for row in rows:
+        for ordinal, row in enumerate(rows):
             order_str = row.get("Order", "1").strip()
             order = int(order_str) if order_str.isdigit() else 1
 
-            projects_data.append({
-                "id": str(uuid.uuid4()),
-                "user_id": None,  # Will need manual linking
-                "name": row.get("Name", "").strip() or "Untitled",
-                "description": row.get("Description", "").strip() or None,
-                "link": row.get("Link", "").strip() or None,
-                "photo_url": row.get("Photo", "").strip() or None,
-                "display_order": order,
-                "created_at": parse_date(row.get("Creation Date", "")),
-                "updated_at": parse_date(row.get("Modified Date", "")),
-            })
-
-        self._insert_records("projects", projects_data)
-        print(f"  Migrated {len(projects_data)} projects")
+            yield ROW_TYPES["projects"](
+                id=row_id("projects", row, ordinal),
+                user_id=None,  # Will need manual linking
+                name=row.get("Name", "").strip() or "Untitled",
+                description=row.get("Description", "").strip() or None,
+                link=row.get("Link", "").strip() or None,
+                photo_url=row.get("Photo", "").strip() or None,
+                display_order=order,
+                created_at=parse_date(row.get("Creation Date", "")),
+                updated_at=parse_date(row.get("Modified Date", "")),
+            )
 
     def migrate_videos(self):
         """Migrate videos table."""
-        print("\n=== Migrating Videos ===")
-        rows = read_csv(CSV_FILES["videos"])
-        print(f"Found {len(rows)} video records")
+        self._migrate_table("videos")
 
-        videos_data = []
-        for row in rows:
+    def transform_videos(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             user_id = self.get_user_id(row.get("Creator", ""))
 
             url = row.get("URL", "").strip()
@@ -329,90 +2930,62 @@ class DataMigrator:
             if not url:
                 continue
 
-            videos_data.append({
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "url": url,
-                "created_at": parse_date(row.get("Creation Date", "")),
-                "updated_at": parse_date(row.get("Modified Date", "")),
-            })
-
-        self._insert_records("videos", videos_data)
-        print(f"  Migrated {len(videos_data)} videos")
+            yield ROW_TYPES["videos"](
+                id=row_id("videos", row, ordinal),
+                user_id=user_id,
+                url=url,
+                created_at=parse_date(row.get("Creation Date", "")),
+                updated_at=parse_date(row.get("Modified Date", "")),
+            )
 
     def migrate_likes(self):
         """Migrate likes table."""
-        print("\n=== Migrating Likes ===")
-        rows = read_csv(CSV_FILES["likes"])
-        print(f"Found {len(rows)} like records")
+        self._migrate_table("likes")
 
-        likes_data = []
-        seen = set()
-        for row in rows:
+    def transform_likes(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             sender_id = self.get_user_id(row.get("Sender", ""))
             receiver_id = self.get_user_id(row.get("Receiver", ""))
 
             if not sender_id or not receiver_id:
                 continue
 
-            # Prevent duplicates
-            key = (sender_id, receiver_id)
-            if key in seen:
-                continue
-            seen.add(key)
-
-            likes_data.append({
-                "id": str(uuid.uuid4()),
-                "sender_id": sender_id,
-                "receiver_id": receiver_id,
-                "created_at": parse_date(row.get("Creation Date", "")),
-            })
-
-        self._insert_records("likes", likes_data)
-        print(f"  Migrated {len(likes_data)} likes")
+            yield ROW_TYPES["likes"](
+                id=row_id("likes", row, ordinal),
+                sender_id=sender_id,
+                receiver_id=receiver_id,
+                created_at=parse_date(row.get("Creation Date", "")),
+            )
 
     def migrate_met_ups(self):
         """Migrate met_ups table."""
-        print("\n=== Migrating Met Ups ===")
-        rows = read_csv(CSV_FILES["met_ups"])
-        print(f"Found {len(rows)} met up records")
+        self._migrate_table("met_ups")
 
-        met_ups_data = []
-        seen = set()
-        for row in rows:
+    def transform_met_ups(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             user1_id = self.get_user_id(row.get("Creator", ""))
             user2_id = self.get_user_id(row.get("User 2", ""))
 
             if not user1_id or not user2_id:
                 continue
 
-            # Normalize order to prevent duplicates
-            if user1_id > user2_id:
+            # Normalize order to prevent duplicates (by UUID, not handle)
+            if self.user_ids[user1_id] > self.user_ids[user2_id]:
                 user1_id, user2_id = user2_id, user1_id
 
-            key = (user1_id, user2_id)
-            if key in seen:
-                continue
-            seen.add(key)
-
-            met_ups_data.append({
-                "id": str(uuid.uuid4()),
-                "user1_id": user1_id,
-                "user2_id": user2_id,
-                "created_at": parse_date(row.get("Creation Date", "")),
-            })
-
-        self._insert_records("met_ups", met_ups_data)
-        print(f"  Migrated {len(met_ups_data)} met ups")
+            yield ROW_TYPES["met_ups"](
+                id=row_id("met_ups", row, ordinal),
+                user1_id=user1_id,
+                user2_id=user2_id,
+                created_at=parse_date(row.get("Creation Date", "")),
+            )
 
     def migrate_messages(self):
         """Migrate messages table."""
-        print("\n=== Migrating Messages ===")
-        rows = read_csv(CSV_FILES["messages"])
-        print(f"Found {len(rows)} message records")
+        self._migrate_table("messages")
 
-        messages_data = []
-        for row in rows:
+    def transform_messages(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             sender_id = self.get_user_id(row.get("Creator", ""))
             recipient_id = self.get_user_id(row.get("Recipient", ""))
             content = row.get("Value", "").strip()
@@ -420,26 +2993,21 @@ class DataMigrator:
             if not content:
                 continue
 
-            messages_data.append({
-                "id": str(uuid.uuid4()),
-                "sender_id": sender_id,
-                "recipient_id": recipient_id,
-                "content": content,
-                "created_at": parse_date(row.get("Creation Date", "")),
-                "updated_at": parse_date(row.get("Modified Date", "")),
-            })
-
-        self._insert_records("messages", messages_data)
-        print(f"  Migrated {len(messages_data)} messages")
+            yield ROW_TYPES["messages"](
+                id=row_id("messages", row, ordinal),
+                sender_id=sender_id,
+                recipient_id=recipient_id,
+                content=content,
+                created_at=parse_date(row.get("Creation Date", "")),
+                updated_at=parse_date(row.get("Modified Date", "")),
+            )
 
     def migrate_friend_testimonials(self):
         """Migrate friend testimonials table."""
-        print("\n=== Migrating Friend Testimonials ===")
-        rows = read_csv(CSV_FILES["friend_testimonials"])
-        print(f"Found {len(rows)} friend testimonial records")
+        self._migrate_table("friend_testimonials")
 
-        testimonials_data = []
-        for row in rows:
+    def transform_friend_testimonials(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             author_id = self.get_user_id(row.get("Creator", ""))
             subject_id = self.get_user_id(row.get("Subject", ""))
             content = row.get("Value", "").strip()
@@ -447,190 +3015,1087 @@ class DataMigrator:
             if not content:
                 continue
 
-            testimonials_data.append({
-                "id": str(uuid.uuid4()),
-                "author_id": author_id,
-                "subject_id": subject_id,
-                "content": content,
-                "created_at": parse_date(row.get("Creation Date", "")),
-                "updated_at": parse_date(row.get("Modified Date", "")),
-            })
-
-        self._insert_records("friend_testimonials", testimonials_data)
-        print(f"  Migrated {len(testimonials_data)} friend testimonials")
+            yield ROW_TYPES["friend_testimonials"](
+                id=row_id("friend_testimonials", row, ordinal),
+                author_id=author_id,
+                subject_id=subject_id,
+                content=content,
+                created_at=parse_date(row.get("Creation Date", "")),
+                updated_at=parse_date(row.get("Modified Date", "")),
+            )
 
     def migrate_app_testimonials(self):
         """Migrate app testimonials table."""
-        print("\n=== Migrating App Testimonials ===")
-        rows = read_csv(CSV_FILES["app_testimonials"])
-        print(f"Found {len(rows)} app testimonial records")
+        self._migrate_table("app_testimonials")
 
-        testimonials_data = []
-        for row in rows:
+    def transform_app_testimonials(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             author_id = self.get_user_id(row.get("Creator", ""))
             content = row.get("Value", "").strip()
 
             if not content:
                 continue
 
-            testimonials_data.append({
-                "id": str(uuid.uuid4()),
-                "author_id": author_id,
-                "username": row.get("Username", "").strip() or None,
-                "content": content,
-                "created_at": parse_date(row.get("Creation Date", "")),
-                "updated_at": parse_date(row.get("Modified Date", "")),
-            })
-
-        self._insert_records("app_testimonials", testimonials_data)
-        print(f"  Migrated {len(testimonials_data)} app testimonials")
+            yield ROW_TYPES["app_testimonials"](
+                id=row_id("app_testimonials", row, ordinal),
+                author_id=author_id,
+                username=row.get("Username", "").strip() or None,
+                content=content,
+                created_at=parse_date(row.get("Creation Date", "")),
+                updated_at=parse_date(row.get("Modified Date", "")),
+            )
 
     def migrate_pairings(self):
         """Migrate pairings table."""
-        print("\n=== Migrating Pairings ===")
-        rows = read_csv(CSV_FILES["pairings"])
-        print(f"Found {len(rows)} pairing records")
+        self._migrate_table("pairings")
 
-        pairings_data = []
-        for row in rows:
+    def transform_pairings(self, rows: Iterable[dict]) -> Iterator[tuple]:
+        for ordinal, row in enumerate(rows):
             match1_name = row.get("Match 1 ", "").strip()
             match2_name = row.get("Match 2", "").strip()
 
-            match1_id = self.get_user_id(match1_name) if match1_name else None
-            match2_id = self.get_user_id(match2_name) if match2_name else None
+            match2_alt_name = row.get("Match 2 Alt name", "").strip()
+
+            match1_id = self.get_user_id(match1_name)
+            match2_id = self.get_user_id(match2_name) or self.get_user_id(match2_alt_name)
 
             here_for = parse_array(row.get("Here for", ""))
 
-            pairings_data.append({
-                "id": str(uuid.uuid4()),
-                "match1_id": match1_id,
-                "match2_id": match2_id,
-                "match1_name": match1_name or None,
-                "match2_name": match2_name or None,
-                "match2_alt_name": row.get("Match 2 Alt name", "").strip() or None,
-                "contact_info": row.get("Contact Info2", "").strip() or None,
-                "description": row.get("Description", "").strip() or None,
-                "here_for": here_for,
-                "anonymous": row.get("Anonymous", "").lower() == "yes",
-            })
-
-        self._insert_records("pairings", pairings_data)
-        print(f"  Migrated {len(pairings_data)} pairings")
-
-    def _insert_records(self, table: str, records: list[dict]):
-        """Insert records into table."""
-        if not records:
+            yield ROW_TYPES["pairings"](
+                id=row_id("pairings", row, ordinal),
+                match1_id=match1_id,
+                match2_id=match2_id,
+                match1_name=match1_name or None,
+                match2_name=match2_name or None,
+                match2_alt_name=match2_alt_name or None,
+                contact_info=row.get("Contact Info2", "").strip() or None,
+                description=row.get("Description", "").strip() or None,
+                here_for=here_for,
+                anonymous=row.get("Anonymous", "").lower() == "yes",
+            )
+
+    def _read_rows(self, name: str) -> Iterable[dict]:
+        """Rows of a CSV_FILES entry: streamed from disk or from the table cache."""
+        if self.stream:
+            return iter_csv(CSV_FILES[name])
+        return self.tables.get(name)
+
+    def _use_workers(self, table: str) -> bool:
+        """Whether to parse and transform a table's export in worker processes.
+
+        Users stay in this process: their transform fills email_map and user_map.
+        Compressed exports have no byte offsets to split at and are read here.
+        """
+        if self.transform_workers <= 1 or table == "users":
+            return False
+        filepath = EXPORT_DIR / CSV_FILES[table]
+        return filepath.exists() and not is_compressed(filepath) and filepath.stat().st_size > TRANSFORM_CHUNK_BYTES
+
+    def _transform_parallel(self, table: str) -> Iterator[tuple]:
+        """Parse and transform an export in chunks across worker processes.
+
+        Chunks are submitted a few at a time and their rows yielded in file
+        order, so output (and checkpoint offsets) match the serial path and
+        memory stays bounded when streaming. Workers see a read-only copy of
+        the id maps. Fallback ids derived from a row's position are fixed up
+        here, where each chunk's global starting ordinal is known.
+        """
+        fieldnames, ranges = csv_chunks(EXPORT_DIR / CSV_FILES[table])
+        row_type = ROW_TYPES[table]
+        id_index = TABLE_COLUMNS[table].index("id")
+        print(f"  Transforming {len(ranges)} chunks in {self.transform_workers} processes")
+
+        chunks = iter(ranges)
+        pending: deque = deque()
+        base = 0
+        with ProcessPoolExecutor(max_workers=self.transform_workers, initializer=_init_worker,
+                                 initargs=(EXPORT_DIR, CSV_FILES, self.user_ids, self.user_map, self.email_map,
+                                           self.names)) as pool:
+            for start, end in islice(chunks, self.transform_workers * 2):
+                pending.append(pool.submit(_transform_chunk, table, start, end, fieldnames))
+            while pending:
+                rows, parsed, fallbacks, name_stats = pending.popleft().result()
+                self.names.merge_stats(*name_stats)
+                following = next(chunks, None)
+                if following:
+                    pending.append(pool.submit(_transform_chunk, table, *following, fieldnames))
+                for index, ordinal in fallbacks:
+                    row = list(rows[index])
+                    row[id_index] = stable_id(table, f"#{base + ordinal}")
+                    rows[index] = row
+                base += parsed
+                yield from map(row_type._make, rows)
+
+    def _pipeline(self, table: str, rows: Optional[Iterable[dict]] = None) -> Iterator[tuple]:
+        """Transform and dedupe rows of a table, timing each stage.
+
+        Without `rows` the export is parsed and transformed by worker processes.
+        """
+        metrics = self.metrics
+        if rows is None:
+            records = metrics.timed(table, "transform", self._transform_parallel(table))
+        else:
+            records = metrics.timed(table, "transform", getattr(self, f"transform_{table}")(rows),
+                                    upstream="read" if self.stream else None)
+        if table in DEDUPE_KEYS:
+            records = metrics.timed(table, "dedupe", dedupe(records, dedupe_key(table)), upstream="transform")
+        return records
+
+    def _migrate_table(self, table: str, replay: bool = False):
+        """Run a table through parse -> transform -> dedupe -> batch -> sink.
+
+        In streaming mode at most `in_flight` transformed rows are held at a
+        time; otherwise the whole export is transformed before inserting.
+        Both paths produce the same records in the same order and commit in
+        batches, recording each committed offset in the checkpoint so a
+        resumed run skips what was already written. `replay` re-runs the
+        transform of a completed table for its side effects (e.g. email_map).
+        With `loaders`, batches are written by _load_pipelined while the
+        following ones are still being transformed, on either path; large
+        exports with `partitions` go through _load_partitions instead.
+        """
+        title, noun = TABLE_LABELS[table]
+        print(f"\n=== Migrating {title} ===")
+
+        done = self.checkpoint.is_done(table)
+        if done and not replay:
+            print("  Already migrated (checkpoint), skipping")
+            self.tables.release(table)
+            return
+        if self.sync and not replay and self.sync.unchanged(table):
+            print("  Export unchanged since last sync, skipping")
+            self.tables.release(table)
+            return
+        if self.push_down and table in USER_REFERENCES and self._push_down_table(table):
+            return
+
+        metrics = self.metrics
+        if self._use_workers(table):
+            # Workers read the export themselves; drop this consumer's cache entry
+            rows = None
+            self.tables.release(table)
+        elif self.stream:
+            rows = metrics.timed(table, "read", self._read_rows(table))
+        else:
+            with metrics.timer(table, "read"):
+                rows = self._read_rows(table)
+            print(f"Found {len(rows)} {noun} records")
+
+        records = self._pipeline(table, rows)
+        if self.sync:
+            records = self.sync.changed(table, records, self.user_ids)
+        if not self.stream:
+            if not self.loaders or done:
+                records = list(records)
+                metrics.expect(table, len(records))
+            self.tables.release(table)
+
+        if done:
+            for _ in records:
+                pass
+            print("  Already migrated (checkpoint), rebuilt ids only")
             return
 
-        if self.supabase:
-            batch_size = 100
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i + batch_size]
+        # Records before the checkpointed offset were committed by an earlier run
+        offset = self.checkpoint.offset(table)
+        if offset:
+            print(f"  Resuming after {offset} committed {noun} records")
+        if self.resume and self.sink:
+            self.sink.resume(table, offset)
+
+        count = offset
+        batch_rows = self.in_flight if self.stream else self.commit_every
+        if not (self.sink and self.sink.adaptive):
+            batch_rows = self._override(self.batch_rows, table) or batch_rows
+        conflict = CONFLICT_CLAUSES.get(table, DEFAULT_CONFLICT)
+        if self.sync and table not in SYNC_INSERT_ONLY:
+            conflict = upsert_clause(table)
+        partitions = self._partition_count(table)
+        batches = batched(islice(records, offset, None), batch_rows)
+        if partitions > 1:
+            count += self._load_partitions(table, records, conflict, partitions, batch_rows, offset)
+        elif self.loaders:
+            count = self._load_pipelined(table, batches, conflict, offset)
+        else:
+            for batch in batches:
+                self._insert_records(table, batch, conflict)
+                count += len(batch)
+                with metrics.timer(table, "commit"):
+                    self.checkpoint.record_offset(table, count)
+
+        self.checkpoint.mark_done(table)
+        if self.sync:
+            self.sync.commit(table)
+        if metrics.progress:
+            sys.stderr.write("\n")
+        print(f"  Migrated {count} {title.lower()}")
+
+    def _load_pipelined(self, table: str, batches: Iterator[list], conflict: str, offset: int = 0) -> int:
+        """Write batches on `loaders` threads while a producer thread transforms the next ones.
+
+        The producer runs the parse/transform pipeline and keeps at most
+        PIPELINE_DEPTH ready batches queued, blocking when the loaders fall
+        behind. This thread is the first loader; the others write through
+        their own spawned sinks. The checkpoint only advances past batches
+        committed together with every batch before them, so a resumed run
+        never skips one still in flight. The first error in the producer or
+        a loader stops the rest and is raised here. Returns the new offset.
+        """
+        ready: queue.Queue = queue.Queue(maxsize=PIPELINE_DEPTH)
+        stop = threading.Event()
+        errors: list[BaseException] = []
+        committed: dict[int, int] = {}  # sequence number -> rows, for batches written out of order
+        progress = {"next": 0, "count": offset}
+        lock = threading.Lock()
+
+        def put(item) -> bool:
+            while not stop.is_set():
                 try:
-                    self.supabase.table(table).insert(batch).execute()
-                except Exception as e:
-                    print(f"  Error inserting into {table}: {e}")
-        elif self.conn:
-            # Build dynamic insert query
-            columns = list(records[0].keys())
-            placeholders = ", ".join(["%s"] * len(columns))
-            col_names = ", ".join(columns)
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
 
-            with self.conn.cursor() as cur:
-                for record in records:
-                    values = [record[col] for col in columns]
+        def fail(error: BaseException):
+            with lock:
+                errors.append(error)
+            stop.set()
+
+        def produce():
+            try:
+                for sequence, batch in enumerate(batches):
+                    if not put((sequence, batch)):
+                        return
+                for _ in range(self.loaders):
+                    put(None)
+            except BaseException as e:
+                fail(e)
+
+        def load(sink: Sink):
+            try:
+                while not stop.is_set():
                     try:
-                        cur.execute(
-                            f"INSERT INTO {table} ({col_names}) VALUES ({placeholders}) ON CONFLICT DO NOTHING",
-                            values
-                        )
-                    except Exception as e:
-                        print(f"  Error inserting record: {e}")
-            self.conn.commit()
+                        item = ready.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if item is None:
+                        return
+                    sequence, batch = item
+                    self._insert_records(table, batch, conflict, sink)
+                    with lock:
+                        committed[sequence] = len(batch)
+                        advanced = progress["next"] in committed
+                        while progress["next"] in committed:
+                            progress["count"] += committed.pop(progress["next"])
+                            progress["next"] += 1
+                        if advanced:
+                            with self.metrics.timer(table, "commit"):
+                                self.checkpoint.record_offset(table, progress["count"])
+            except BaseException as e:
+                fail(e)
+
+        sinks: list[Sink] = []
+        threads = [threading.Thread(target=produce, name=f"{table}-transform", daemon=True)]
+        try:
+            for n in range(1, self.loaders):
+                sinks.append(self.sink.spawn())
+                threads.append(threading.Thread(target=load, args=(sinks[-1],), name=f"{table}-load-{n}",
+                                                 daemon=True))
+            for thread in threads:
+                thread.start()
+            load(self.sink)
+        except BaseException as e:
+            fail(e)
+        finally:
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+            for sink in sinks:
+                sink.close()
+        if errors:
+            raise errors[0]
+        return progress["count"]
+
+    def _partition_count(self, table: str) -> int:
+        """Partitions to load a table in: `partitions`, as far as the server has connections for."""
+        if self.partitions <= 1 or table == "users" or self.sync or not isinstance(self.sink, PostgresSink):
+            return 0
+        filepath = EXPORT_DIR / CSV_FILES[table]
+        if not filepath.exists() or filepath.stat().st_size <= PARTITION_MIN_BYTES:
+            return 0
+        available = self.sink.available_connections()
+        if available <= 1:
+            print(f"  The server accepts {max(available, 0)} more connections, loading serially")
+        elif available < self.partitions:
+            print(f"  The server accepts {available} more connections, "
+                  f"loading {available} partitions instead of {self.partitions}")
+        return min(self.partitions, available)
+
+    def _load_partitions(self, table: str, records: Iterable[tuple], conflict: str, partitions: int,
+                         batch_rows: int, offset: int = 0) -> int:
+        """Load a table in `partitions` parts at once over pooled connections, each in one transaction.
+
+        Rows go to partitions by partition_of() their id, so every copy of
+        an id is written in export order by the same connection. Each
+        partition's loader writes its batches as they fill up and commits
+        once the whole export has been routed; the checkpoint records every
+        committed partition, and a resumed run loads only the others. A
+        failing partition is rolled back without stopping the rest, then
+        retried alone up to PARTITION_RETRIES times, re-reading the export
+        for just its rows. Returns the number of rows committed.
+        """
+        committed = self.checkpoint.partitions(table, partitions)
+        pending = [partition for partition in range(partitions) if partition not in committed]
+        if committed:
+            print(f"  {len(committed)} of {partitions} partitions committed by an earlier run")
+        if not pending:
+            return 0
+        print(f"  Loading {len(pending)} of {partitions} partitions, one connection each")
+
+        pool = self.sink.connection_pool(len(pending))
+        try:
+            status = self._load_partition_pass(table, records, conflict, partitions, pending, pool, batch_rows, offset)
+            for attempt in range(1, PARTITION_RETRIES + 1):
+                failed = [partition for partition in pending if status[partition][0] == "failed"]
+                for partition in failed:
+                    print(f"  Retrying partition {partition + 1}/{partitions} alone "
+                          f"(attempt {attempt} of {PARTITION_RETRIES})")
+                    rows = None if self._use_workers(table) else iter_csv(CSV_FILES[table])
+                    status.update(self._load_partition_pass(table, self._pipeline(table, rows), conflict, partitions,
+                                                            [partition], pool, batch_rows, offset))
+        finally:
+            pool.closeall()
+
+        failed = [partition for partition in pending if status[partition][0] == "failed"]
+        if failed:
+            raise RuntimeError(f"{table}: partitions {', '.join(str(p + 1) for p in failed)} of {partitions} failed; "
+                               f"rerun with --resume to load only those")
+        return sum(status[partition][1] for partition in pending)
+
+    def _load_partition_pass(self, table: str, records: Iterable[tuple], conflict: str, partitions: int,
+                             pending: list[int], pool, batch_rows: int, offset: int = 0) -> dict[int, tuple]:
+        """Route records to a loader thread per pending partition; returns each one's status.
+
+        A status is ("committed", rows written, dead letters excluded) or
+        ("failed", error). An error in the records themselves rolls every
+        partition back and is raised.
+        """
+        id_index = TABLE_COLUMNS[table].index("id")
+        ready = {partition: queue.Queue(maxsize=PIPELINE_DEPTH) for partition in pending}
+        stop = threading.Event()
+        status: dict[int, tuple] = {}
+        waited = dict.fromkeys(pending, 0.0)  # seconds each loader spent waiting for rows
+
+        def put(partition: int, item):
+            while not stop.is_set():
+                try:
+                    ready[partition].put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def take(partition: int) -> Iterator[list]:
+            while True:
+                if stop.is_set():
+                    raise RuntimeError("routing rows failed")
+                started = time.perf_counter()
+                try:
+                    item = ready[partition].get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                finally:
+                    waited[partition] += time.perf_counter() - started
+                if item is None:
+                    return
+                yield item
+
+        def load(partition: int):
+            started = time.perf_counter()
+            rows = 0
+            rejects = []
+
+            def batches() -> Iterator[list]:
+                nonlocal rows
+                for batch in take(partition):
+                    rows += len(batch)
+                    yield list(self.user_ids.materialize(table, batch))
+
+            conn = None
+            try:
+                conn = pool.getconn()
+                nbytes = self.sink.load_partition(conn, table, batches(), conflict,
+                                                  lambda record, reason: rejects.append((record, reason)))
+            except Exception as e:
+                status[partition] = ("failed", e)
+                if conn is not None:
+                    pool.putconn(conn, close=True)
+                # Keep taking this partition's rows so routing goes on for the others
+                try:
+                    for _ in take(partition):
+                        pass
+                except RuntimeError:
+                    pass
+                return
+            pool.putconn(conn)
+            self.checkpoint.record_partition(table, partition, partitions)
+            for record, reason in rejects:
+                self.dead_letters.add(table, record, reason)
+            self.metrics.batch_written(table, rows - len(rejects), time.perf_counter() - started - waited[partition],
+                                       nbytes, 0, len(rejects))
+            status[partition] = ("committed", rows - len(rejects))
+
+        threads = [threading.Thread(target=load, args=(partition,), name=f"{table}-partition-{partition + 1}",
+                                    daemon=True) for partition in pending]
+        for thread in threads:
+            thread.start()
+        buffers: dict[int, list] = {partition: [] for partition in pending}
+        try:
+            for record in islice(records, offset, None):
+                partition = partition_of(record[id_index], partitions)
+                buffer = buffers.get(partition)
+                if buffer is None:
+                    continue  # committed by an earlier run
+                buffer.append(record)
+                if len(buffer) >= batch_rows:
+                    put(partition, buffer)
+                    buffers[partition] = []
+            for partition, buffer in buffers.items():
+                if buffer:
+                    put(partition, buffer)
+                put(partition, None)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        for partition in pending:
+            state, detail = status[partition]
+            if state == "committed":
+                print(f"  Partition {partition + 1}/{partitions}: committed {detail} rows")
+            else:
+                reason = str(detail).strip().splitlines()[0] if str(detail).strip() else ""
+                print(f"  Partition {partition + 1}/{partitions}: failed ({detail.__class__.__name__}: {reason}), "
+                      f"rolled back")
+        return status
+
+    def _push_down_table(self, table: str) -> bool:
+        """Load and transform a table inside the database; False to use the Python path."""
+        filepath = EXPORT_DIR / CSV_FILES[table]
+        if not filepath.exists():
+            return False
+        expected = None
+        if self.verify_push_down:
+            expected = self.user_ids.materialize(table, self._pipeline(table, iter_csv(CSV_FILES[table])))
+        rows = self.sink.push_down(table, filepath, expected, self.resolve_names)
+        if rows is None:
+            return False
+        self.tables.release(table)
+        self.checkpoint.mark_done(table)
+        print(f"  Migrated {rows} {TABLE_LABELS[table][0].lower()} in the database")
+        return True
+
+    def _insert_records(self, table: str, records: list[tuple],
+                        conflict: str = DEFAULT_CONFLICT, sink: Optional[Sink] = None):
+        """Insert records into table (through `sink`, else this run's), materializing user handles as UUIDs."""
+        if not records:
+            return
+
+        started = time.perf_counter()
+        records = list(self.user_ids.materialize(table, records))
+        rejected = 0
+
+        def reject(record: dict, reason: str):
+            nonlocal rejected
+            rejected += 1
+            self.dead_letters.add(table, record, reason)
+            if self.sync:
+                self.sync.discard(table, record_dict(record).get("id"))
+
+        nbytes, errors = (sink or self.sink).write(table, records, conflict, reject)
+        self.metrics.batch_written(table, len(records) - rejected, time.perf_counter() - started,
+                                   nbytes, errors, rejected)
+
+    @staticmethod
+    def _override(overrides: dict[str, int], table: str) -> Optional[int]:
+        return overrides.get(table, overrides.get("*"))
+
+    def _batcher(self, table: str) -> AdaptiveBatcher:
+        """Return the REST batcher for table, kept across batches so tuning carries over."""
+        batcher = self.batchers.get(table)
+        if batcher is None:
+            rows = self._override(self.batch_rows, table)
+            batcher = AdaptiveBatcher(max_bytes=self._override(self.batch_bytes, table) or REST_BATCH_BYTES,
+                                      rows=rows or REST_BATCH_SIZE, fixed=rows is not None)
+            self.batchers[table] = batcher
+        return batcher
+
+    def _spawn_worker(self) -> "DataMigrator":
+        """Create a migrator that shares this run's maps but has its own connection."""
+        worker = type(self)(self.use_supabase, stream=self.stream, in_flight=self.in_flight,
+                            concurrency=self.concurrency, commit_every=self.commit_every,
+                            batch_rows=self.batch_rows, batch_bytes=self.batch_bytes,
+                            sink=self.sink_name, sink_path=self.sink_path,
+                            transform_workers=self.transform_workers, fast_load=self.fast_load,
+                            push_down=self.push_down, verify_push_down=self.verify_push_down,
+                            loaders=self.loaders, name_aliases=self.name_aliases,
+                            partitions=self.partitions)
+        worker.batchers = self.batchers
+        worker.checkpoint = self.checkpoint
+        worker.sync = self.sync
+        worker.resume = self.resume
+        worker.read_only = self.read_only
+        worker.metrics = self.metrics
+        worker.dead_letters = self.dead_letters
+        worker.user_ids = self.user_ids
+        worker.user_map = self.user_map
+        worker.email_map = self.email_map
+        worker.names = self.names
+        worker.tables = self.tables
+        worker.sink = self.sink.spawn()
+        return worker
+
+    def _run_step(self, step: str):
+        """Run a single MIGRATION_STEPS entry on this migrator."""
+        if step == "username_map":
+            self.build_username_map()
+        else:
+            getattr(self, f"migrate_{step}")()
+
+    def run_steps(self, jobs: int = 1):
+        """Run MIGRATION_STEPS in dependency order on up to `jobs` workers.
+
+        Steps whose dependencies are complete run concurrently, each worker
+        thread holding its own database connection or Supabase client. With
+        a single job everything runs in order on this migrator.
+        """
+        total = len(MIGRATION_STEPS)
+        done: set[str] = set()
+        started = time.perf_counter()
+
+        def report(step: str, elapsed: float):
+            done.add(step)
+            print(f"  [{len(done)}/{total}] {step} finished in {elapsed:.1f}s")
+
+        if jobs <= 1:
+            for step in MIGRATION_STEPS:
+                step_started = time.perf_counter()
+                self._run_step(step)
+                report(step, time.perf_counter() - step_started)
+            print(f"  {total} steps finished in {time.perf_counter() - started:.1f}s")
+            return
+
+        local = threading.local()
+        workers: list[DataMigrator] = []
+        workers_lock = threading.Lock()
+
+        def run(step: str) -> float:
+            if not hasattr(local, "worker"):
+                local.worker = self._spawn_worker()
+                with workers_lock:
+                    workers.append(local.worker)
+            step_started = time.perf_counter()
+            local.worker._run_step(step)
+            return time.perf_counter() - step_started
 
-    def run_migration(self):
-        """Run the full migration."""
+        pending = dict(MIGRATION_STEPS)
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                while pending or running:
+                    for step, deps in list(pending.items()):
+                        if all(dep in done for dep in deps):
+                            running[pool.submit(run, step)] = step
+                            del pending[step]
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        step = running.pop(future)
+                        try:
+                            report(step, future.result())
+                        except Exception:
+                            for other in running:
+                                other.cancel()
+                            raise
+        finally:
+            for worker in workers:
+                worker.close()
+
+        print(f"  {total} steps finished in {time.perf_counter() - started:.1f}s with {jobs} workers")
+
+    def run_migration(self, jobs: int = 1, checkpoint_path: Optional[Path] = None,
+                      resume: bool = False, report_path: Optional[Path] = None,
+                      dead_letter_path: Optional[Path] = None, sync: bool = False,
+                      sync_state_path: Optional[Path] = None):
+        """Run the full migration.
+
+        With `sync`, the newest exports in EXPORT_DIR are used and only rows
+        that are new or changed since the last sync are written (SyncState);
+        the sync state takes the place of the checkpoint.
+        """
         print("=" * 50)
         print("Cuties App Data Migration")
         print("=" * 50)
 
+        if sync and self.sink_name in ("file", "memory"):
+            raise ValueError("--sync needs a database sink (supabase, postgres or sqlite)")
+        self.resume = resume
+        self.dead_letters = DeadLetters(dead_letter_path or EXPORT_DIR / DEAD_LETTER_FILE)
         self.connect()
+        if sync:
+            CSV_FILES.update(latest_exports())
+            print("Syncing from exports:")
+            for name, filename in CSV_FILES.items():
+                print(f"  {name}: {filename}")
+            self.sync = SyncState(sync_state_path or EXPORT_DIR / SYNC_STATE_FILE)
+        elif self.sink.durable:
+            self.checkpoint = Checkpoint.open(checkpoint_path or EXPORT_DIR / CHECKPOINT_FILE, resume)
 
         try:
-            # Step 1: Migrate users
-            self.migrate_users()
-
-            # Step 2: Build username map from all tables
-            self.build_username_map()
-
-            # Step 3: Migrate related tables
-            self.migrate_user_links()
-            self.migrate_projects()
-            self.migrate_videos()
-            self.migrate_likes()
-            self.migrate_met_ups()
-            self.migrate_messages()
-            self.migrate_friend_testimonials()
-            self.migrate_app_testimonials()
-            self.migrate_pairings()
+            self.run_steps(jobs)
+            self.sink.finish(self.dead_letters.add)
 
             print("\n" + "=" * 50)
             print("Migration Complete!")
             print("=" * 50)
+            for line in self.metrics.summary():
+                print(line)
+            for line in self.names.summary():
+                print(line)
 
         finally:
             self.close()
+            if self.sync:
+                self.sync.close()
+            self.dead_letters.close()
+            if self.dead_letters.total:
+                print(f"{self.dead_letters.total} rejected rows written to: {self.dead_letters.path}")
+            if report_path:
+                report = self.metrics.report()
+                report["name_resolution"] = self.names.report()
+                report_path.write_text(json.dumps(report, indent=2))
+                print(f"Run report written to: {report_path}")
 
+    def verify(self) -> bool:
+        """Reconcile every table in the database with the exports (--verify).
 
-def generate_sql_inserts():
-    """Generate SQL INSERT statements for manual migration."""
-    print("Generating SQL INSERT statements...")
+        Each table is transformed as a migration would (without writing) and
+        both sides are reduced to a row count and a sum of verify_digest()
+        hashes per id prefix bucket; the database side is one aggregate
+        query. Only buckets that differ are fetched row by row, re-running
+        the transform for just those ids, and the missing, extra and changed
+        ids are reported. Returns True if every table matches.
+        """
+        print("=" * 50)
+        print("Cuties App Migration Verification")
+        print("=" * 50)
 
-    output_file = EXPORT_DIR.parent / "supabase" / "seed_data.sql"
+        self.stream = True
+        self.read_only = True
+        self.connect()
+        if not isinstance(self.sink, PostgresSink):
+            raise RuntimeError("--verify needs a direct PostgreSQL connection (--direct)")
+        started = time.perf_counter()
+        matched = True
+        try:
+            tz = self.sink.time_zone()
+            for step in MIGRATION_STEPS:
+                if step == "username_map":
+                    self.build_username_map()
+                else:
+                    matched &= self._verify_table(step, tz)
+        finally:
+            self.close()
+        print(f"\n{'All tables match' if matched else 'Differences found'} "
+              f"({time.perf_counter() - started:.1f}s)")
+        return matched
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("-- Cuties App Seed Data\n")
-        f.write("-- Generated from Bubble.io exports\n\n")
+    def _verify_digests(self, table: str, tz: timezone) -> Iterator[tuple[str, int]]:
+        """(id, verify_digest) of every row a migration would insert into table."""
+        rows = None if self._use_workers(table) else self._read_rows(table)
+        seen: set[str] = set()
+        for record in self.user_ids.materialize(table, self._pipeline(table, rows)):
+            # The first row with an id wins, as with the conflict clauses
+            if record.id not in seen:
+                seen.add(record.id)
+                yield record.id, verify_digest(record, tz)
+
+    def _verify_table(self, table: str, tz: timezone) -> bool:
+        print(f"\n=== Verifying {TABLE_LABELS[table][0]} ===")
+        started = time.perf_counter()
+        fine: dict[str, list[int]] = {}
+        for key, digest in self._verify_digests(table, tz):
+            bucket = fine.setdefault(key[:VERIFY_PREFIX_MAX], [0, 0])
+            bucket[0] += 1
+            bucket[1] += digest
+        rows = sum(count for count, _ in fine.values())
+        prefix = verify_prefix(rows)
+        expected: dict[str, tuple[int, int]] = {}
+        for key, (count, total) in fine.items():
+            count_before, total_before = expected.get(key[:prefix], (0, 0))
+            expected[key[:prefix]] = (count_before + count, total_before + total)
+
+        actual = self.sink.verify_buckets(table, prefix)
+        in_database = sum(count for count, _ in actual.values())
+        differing = sorted(key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key))
+        elapsed = time.perf_counter() - started
+        if not differing:
+            print(f"  {rows} rows match ({len(expected)} buckets, {elapsed:.1f}s)")
+            return True
+
+        print(f"  {rows} rows expected, {in_database} in the database; "
+              f"{len(differing)} of {len(expected.keys() | actual.keys())} buckets differ ({elapsed:.1f}s)")
+        fetched = differing[:VERIFY_MAX_BUCKETS]
+        if len(differing) > len(fetched):
+            print(f"  Comparing rows of the first {len(fetched)} differing buckets")
+        database = self.sink.verify_rows(table, prefix, fetched)
+        wanted = set(fetched)
+        exported = {key: digest for key, digest in self._verify_digests(table, tz) if key[:prefix] in wanted}
+        differences = {
+            "missing from the database": sorted(exported.keys() - database.keys()),
+            "not in the exports": sorted(database.keys() - exported.keys()),
+            "changed": sorted(key for key in exported.keys() & database.keys() if exported[key] != database[key]),
+        }
+        for kind, ids in differences.items():
+            if ids:
+                sample = ", ".join(ids[:VERIFY_SAMPLE_IDS]) + (", ..." if len(ids) > VERIFY_SAMPLE_IDS else "")
+                print(f"  {len(ids)} {kind}: {sample}")
+        return False
+
+
+def sql_literal(value) -> str:
+    """Render a Python value as a PostgreSQL literal for INSERT statements."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, (list, tuple)):
+        text = "{" + ",".join(_pg_array_element(v) for v in value) + "}"
+    else:
+        text = str(value)
+    return "'" + text.replace("'", "''") + "'"
+
+
+def dump_text(table: str, records: Iterable[tuple], columns: Iterable[str], fmt: str = "copy",
+              conflict: str = DEFAULT_CONFLICT) -> str:
+    """Render row tuples as COPY text lines or one multi-row INSERT statement."""
+    if fmt == "copy":
+        return "".join("\t".join(map(copy_value, r)) + "\n" for r in records)
+    values = ",\n".join("(" + ", ".join(map(sql_literal, r)) + ")" for r in records)
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES\n{values}\n{conflict};\n"
+
+
+def write_table_dump(path: Path, table: str, records: Iterable[tuple], fmt: str = "copy",
+                     conflict: str = DEFAULT_CONFLICT) -> tuple[int, list[str]]:
+    """Write records as COPY text or multi-row INSERTs, gzip-compressed for .gz paths.
+
+    Output is assembled into ~1 MiB chunks before each write. Returns the
+    row count and the column order used.
+    """
+    records = iter(records)
+    first = next(records, None)
+    columns = list(first._fields) if first else []
+    count = 0
+    chunk: list[str] = []
+    chunk_size = 0
+
+    if path.suffix == ".gz":
+        output = gzip.open(path, "wb", compresslevel=DUMP_GZIP_LEVEL)
+    else:
+        output = open(path, "wb")
+    with output as f:
+        if first is None:
+            return 0, columns
+        for batch in batched(chain([first], records), INSERT_PAGE_SIZE):
+            text = dump_text(table, batch, columns, fmt, conflict)
+            chunk.append(text)
+            chunk_size += len(text)
+            count += len(batch)
+            if chunk_size >= DUMP_CHUNK_BYTES:
+                f.write("".join(chunk).encode("utf-8"))
+                chunk, chunk_size = [], 0
+        if chunk:
+            f.write("".join(chunk).encode("utf-8"))
+    return count, columns
+
+
+# Migrator used by dump and transform worker processes, set up once per process
+_worker_migrator: Optional[DataMigrator] = None
+
+
+def _init_worker(export_dir: Path, csv_files: dict[str, str], user_ids: UserIds, user_map: dict[str, int],
+                 email_map: dict[str, int], names: NameIndex):
+    global EXPORT_DIR, _worker_migrator
+    EXPORT_DIR = export_dir
+    CSV_FILES.update(csv_files)
+    _worker_migrator = DataMigrator(use_supabase=False, stream=True)
+    _worker_migrator.user_ids = user_ids
+    _worker_migrator.user_map = user_map
+    _worker_migrator.email_map = email_map
+    # Pickled apart from user_map, and with the parent's counts so far
+    names.user_map = user_map
+    names.take_stats()
+    _worker_migrator.names = names
+
+
+def _transform_chunk(table: str, start: int, end: int,
+                     fieldnames: list[str]) -> tuple[list[tuple], int, list[tuple[int, int]], tuple]:
+    """Parse and transform one csv_chunks() range of an export.
+
+    Returns the rows as plain tuples, the number of CSV records parsed,
+    (row index, chunk ordinal) pairs for rows whose id fell back to their
+    position, which the parent rebases onto the whole export, and the
+    chunk's NameIndex counts.
+    """
+    # Mapped rather than read, so every worker decodes straight from the
+    # shared page cache; the view avoids copying the range to bytes first
+    # and must be released before the map closes
+    with open(EXPORT_DIR / CSV_FILES[table], "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with memoryview(data)[start:end] as view:
+            text = io.StringIO(str(view, "utf-8"), newline=None)
+    rows = list(csv.DictReader(text, fieldnames=fieldnames))
+    positional = {stable_id(table, f"#{ordinal}"): ordinal
+                  for ordinal, row in enumerate(rows) if not row.get("unique id")}
+    records = [tuple(record) for record in getattr(_worker_migrator, f"transform_{table}")(rows)]
+    id_index = TABLE_COLUMNS[table].index("id")
+    fallbacks = [(index, positional[record[id_index]]) for index, record in enumerate(records)
+                 if record[id_index] in positional] if positional else []
+    return records, len(rows), fallbacks, _worker_migrator.names.take_stats()
 
-        # Users
-        f.write("-- Users\n")
-        rows = read_csv(CSV_FILES["users"])
-        for row in rows:
-            email = row.get("email", "").strip()
-            if not email:
-                continue
 
-            email_escaped = email.replace("'", "''")
-            desc = (row.get("shortdescription", "") or "").replace("'", "''")
-            age = row.get("Age", "").strip()
-            age_val = age if age.isdigit() else "NULL"
-            consent = "TRUE" if parse_bool(row.get("consent", "")) else "FALSE"
-            bubble_id = row.get("Additional Links", "").strip()
-            bubble_id_val = f"'{bubble_id}'" if bubble_id else "NULL"
+def _dump_table(table: str, path: Path, fmt: str) -> tuple[int, list[str]]:
+    migrator = _worker_migrator
+    records = migrator.user_ids.materialize(table, migrator._pipeline(table, iter_csv(CSV_FILES[table])))
+    return write_table_dump(path, table, records, fmt, CONFLICT_CLAUSES.get(table, DEFAULT_CONFLICT))
 
-            collabs = parse_array(row.get("Collabs", ""))
-            communities = parse_array(row.get("Communities", ""))
-            collabs_arr = "ARRAY[" + ",".join(f"'{c.replace(chr(39), chr(39)+chr(39))}'" for c in collabs) + "]::TEXT[]" if collabs else "'{}'::TEXT[]"
-            communities_arr = "ARRAY[" + ",".join(f"'{c.replace(chr(39), chr(39)+chr(39))}'" for c in communities) + "]::TEXT[]" if communities else "'{}'::TEXT[]"
 
-            f.write(f"INSERT INTO users (email, bubble_id, age, short_description, consent, collaborators, communities) ")
-            f.write(f"VALUES ('{email_escaped}', {bubble_id_val}, {age_val}, '{desc}', {consent}, {collabs_arr}, {communities_arr}) ")
-            f.write("ON CONFLICT (email) DO NOTHING;\n")
+def _load_command(table: str, filename: str, columns: list[str], fmt: str) -> str:
+    """psql lines that load one dump file.
 
-        f.write("\n-- Note: Additional tables require username resolution\n")
-        f.write("-- Run the Python migration script for full data migration\n")
+    COPY files go through a temporary table and an INSERT ... SELECT with
+    the table's conflict clause, like INSERT files, so rows that already
+    exist (a re-run load.sql, users already in the database) are skipped
+    instead of aborting the file. gzipped INSERT files can't be run by
+    psql; generate_sql_dump() refuses to write them.
+    """
+    if fmt == "copy":
+        source = f"PROGRAM 'gzip -dc {filename}'" if filename.endswith(".gz") else f"'{filename}'"
+        staging = f"_load_{table}"
+        names = ", ".join(columns)
+        return (f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS);\n"
+                f"\\copy {staging} ({names}) FROM {source}\n"
+                f"INSERT INTO {table} ({names}) SELECT {names} FROM {staging} "
+                f"{CONFLICT_CLAUSES.get(table, DEFAULT_CONFLICT)};\n"
+                f"DROP TABLE {staging};\n")
+    return f"\\i {filename}"
 
-    print(f"SQL seed file written to: {output_file}")
+
+def generate_sql_dump(output_dir: Optional[Path] = None, fmt: str = "copy",
+                      compress: bool = False, jobs: int = 1, name_aliases: Optional[Path] = None):
+    """Dump every migrated table to per-table files for loading with psql.
+
+    Users and username placeholders are written first (they build the id
+    maps); the remaining tables are transformed and written in parallel
+    worker processes. Ids are the same deterministic ids a live run uses.
+    """
+    if compress and fmt != "copy":
+        raise ValueError("gzip-compressed dumps need the copy format; psql can't run gzipped INSERT files")
+    output_dir = output_dir or DUMP_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Generating {fmt.upper()} seed dump in {output_dir}...")
+    ext = (".copy" if fmt == "copy" else ".sql") + (".gz" if compress else "")
+
+    migrator = DataMigrator(use_supabase=False, stream=True, name_aliases=name_aliases)
+    files: list[tuple[str, str, int, list[str]]] = []
+
+    filename = f"01_users{ext}"
+    rows, columns = write_table_dump(output_dir / filename, "users",
+                                     migrator._pipeline("users", iter_csv(CSV_FILES["users"])),
+                                     fmt, CONFLICT_CLAUSES["users"])
+    files.append(("users", filename, rows, columns))
+    print(f"  users: {rows} rows")
+
+    migrator.build_username_map()
+    # Always INSERTs: names of email users must update existing rows
+    filename = "02_usernames.sql"
+    rows, columns = write_table_dump(
+        output_dir / filename, "users",
+        (UsernameRow(user_id, username) for username, user_id in migrator.username_ids().items()),
+        "insert", USERNAME_UPSERT,
+    )
+    files.append(("users", filename, rows, columns))
+    print(f"  usernames: {rows} rows")
+
+    tables = [step for step in MIGRATION_STEPS if step not in ("users", "username_map")]
+    targets = {table: f"{n:02d}_{table}{ext}" for n, table in enumerate(tables, 3)}
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(EXPORT_DIR, CSV_FILES, migrator.user_ids, migrator.user_map,
+                                           migrator.email_map, migrator.names)) as pool:
+            futures = {table: pool.submit(_dump_table, table, output_dir / filename, fmt)
+                       for table, filename in targets.items()}
+            results = {table: future.result() for table, future in futures.items()}
+    else:
+        _init_worker(EXPORT_DIR, CSV_FILES, migrator.user_ids, migrator.user_map, migrator.email_map,
+                     migrator.names)
+        results = {table: _dump_table(table, output_dir / filename, fmt) for table, filename in targets.items()}
+
+    for table, filename in targets.items():
+        rows, columns = results[table]
+        files.append((table, filename, rows, columns))
+        print(f"  {table}: {rows} rows")
+
+    with open(output_dir / "load.sql", "w", encoding="utf-8") as f:
+        f.write("-- Cuties App Seed Data\n")
+        f.write("-- Generated from Bubble.io exports\n")
+        f.write("--\n")
+        f.write("-- Load from this directory with: psql \"$DATABASE_URL\" -f load.sql\n")
+        f.write("-- The users files must load first. Every later block is independent and\n")
+        f.write("-- can be run concurrently in its own psql session. Rows that already\n")
+        f.write("-- exist are skipped, so the file can be re-run.\n\n")
+        for table, filename, rows, columns in files:
+            if rows:
+                file_fmt = "insert" if filename.endswith(".sql") else fmt
+                f.write(_load_command(table, filename, columns, file_fmt) + "\n")
+
+    print(f"Seed dump written to: {output_dir}")
+
+
+def parse_table_sizes(values: Iterable[str]) -> dict[str, int]:
+    """Parse repeated [TABLE=]SIZE options into {table: size}; a bare SIZE sets "*".
+
+    Sizes accept a k/M suffix (e.g. "messages=256k").
+    """
+    sizes = {}
+    for value in values:
+        table, _, size = value.rpartition("=")
+        table = table or "*"
+        if table != "*" and table not in TABLE_LABELS:
+            raise ValueError(f"unknown table {table!r}")
+        scale = {"k": 1 << 10, "m": 1 << 20}.get(size[-1:].lower(), 1)
+        digits = size[:-1] if scale > 1 else size
+        if not digits.isdigit() or int(digits) <= 0:
+            raise ValueError(f"invalid size {value!r}")
+        sizes[table] = int(digits) * scale
+    return sizes
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Migrate Cuties app data to Supabase")
     parser.add_argument("--direct", action="store_true", help="Use direct PostgreSQL connection")
-    parser.add_argument("--sql-only", action="store_true", help="Generate SQL INSERT statements only")
+    parser.add_argument("--sink", choices=list(SINKS), default=None,
+                        help="Where to write: supabase (default), postgres (same as --direct), "
+                             "file, sqlite or memory")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="With --direct: load into unlogged staging tables, then merge them and "
+                             "rebuild indexes in one transaction")
+    parser.add_argument("--push-down", action="store_true",
+                        help="With --direct: COPY raw exports into the database and transform them in SQL")
+    parser.add_argument("--verify-push-down", action="store_true",
+                        help="Push down, comparing each table with the Python transform first "
+                             "(tables that differ use the Python rows)")
+    parser.add_argument("--sink-path", type=Path, default=None,
+                        help="Output directory for --sink file or database file for --sink sqlite")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Transform and validate every table without a database (--sink memory)")
+    parser.add_argument("--verify", action="store_true",
+                        help="With --direct: compare the database with the exports instead of migrating")
+    parser.add_argument("--sql-only", action="store_true",
+                        help="Dump every table to files for psql instead of migrating")
+    parser.add_argument("--dump-format", choices=["copy", "insert"], default="copy",
+                        help="--sql-only file format: COPY text or multi-row INSERTs")
+    parser.add_argument("--gzip", action="store_true", help="Gzip-compress --sql-only files (copy format only)")
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help="--sql-only output directory (default: supabase/seed_data)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream rows through the pipeline with bounded memory")
+    parser.add_argument("--in-flight", type=int, default=1000,
+                        help="Max transformed rows held in memory per table when streaming")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of tables to migrate (or dump) concurrently")
+    parser.add_argument("--transform-workers", type=int, default=1,
+                        help=f"Processes parsing and transforming exports over {TRANSFORM_CHUNK_BYTES >> 20} MiB")
+    parser.add_argument("--pipeline", type=int, nargs="?", const=1, default=0, metavar="LOADERS",
+                        help="Write each table's batches on LOADERS threads (default 1) while the next "
+                             "batches are transformed")
+    parser.add_argument("--partitions", type=int, default=0, metavar="N",
+                        help=f"With --direct, load each export over {PARTITION_MIN_BYTES >> 20} MiB in N partitions "
+                             "at once over pooled connections, one transaction per partition")
+    parser.add_argument("--concurrency", type=int, default=REST_CONCURRENCY,
+                        help="Max concurrent Supabase REST requests per worker")
+    parser.add_argument("--batch-size", action="append", default=[], metavar="[TABLE=]ROWS",
+                        help="Fixed rows per REST request or direct COPY batch (repeatable)")
+    parser.add_argument("--batch-bytes", action="append", default=[], metavar="[TABLE=]BYTES",
+                        help=f"Encoded bytes per REST request (default: {REST_BATCH_BYTES}, repeatable)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip steps and batches recorded in the checkpoint manifest")
+    parser.add_argument("--sync", action="store_true",
+                        help="Incremental sync: use the newest export files and upsert only rows that are "
+                             "new or changed since the last sync, reporting rows no longer exported")
+    parser.add_argument("--sync-state", type=Path, default=None,
+                        help=f"--sync state database (default: EXPORT_DIR/{SYNC_STATE_FILE})")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help=f"Checkpoint manifest path (default: EXPORT_DIR/{CHECKPOINT_FILE})")
+    parser.add_argument("--report", type=Path, default=None,
+                        help="Write per-table stage metrics as JSON to this path")
+    parser.add_argument("--dead-letter", type=Path, default=None,
+                        help=f"Rejected rows file, .jsonl or .csv (default: EXPORT_DIR/{DEAD_LETTER_FILE})")
+    parser.add_argument("--progress", action="store_true",
+                        help="Show a live progress line with throughput and ETA")
+    parser.add_argument("--name-aliases", type=Path, default=None,
+                        help=f"alias,username CSV of other names users go by (default: EXPORT_DIR/{NAME_ALIASES_FILE})")
     args = parser.parse_args()
+    try:
+        batch_rows = parse_table_sizes(args.batch_size)
+        batch_bytes = parse_table_sizes(args.batch_bytes)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.name_aliases and not args.name_aliases.exists():
+        parser.error(f"--name-aliases: {args.name_aliases} not found")
+    if args.gzip and args.dump_format != "copy":
+        parser.error("--gzip needs --dump-format copy: psql can't run gzipped INSERT files")
+    direct = args.direct or args.sink == "postgres"
+    if args.fast_load and not direct:
+        parser.error("--fast-load requires --direct")
+    if (args.push_down or args.verify_push_down) and not direct:
+        parser.error("--push-down requires --direct")
+    if args.verify and not direct:
+        parser.error("--verify requires --direct")
+    if args.partitions > 1 and not direct:
+        parser.error("--partitions requires --direct")
+    if args.sync and (args.resume or args.fast_load or args.push_down or args.verify_push_down
+                      or args.partitions > 1 or args.sql_only or args.dry_run or args.sink in ("file", "memory")):
+        parser.error("--sync can't be combined with --resume, --fast-load, --push-down, --partitions, "
+                     "--sql-only, --dry-run or the file and memory sinks")
 
-    if args.sql_only:
-        generate_sql_inserts()
+    # The newest export of each table, whatever its timestamp or compression
+    CSV_FILES.update(latest_exports())
+    if args.verify:
+        migrator = DataMigrator(use_supabase=False, transform_workers=args.transform_workers,
+                                name_aliases=args.name_aliases)
+        sys.exit(0 if migrator.verify() else 1)
+    elif args.sql_only:
+        generate_sql_dump(args.output_dir, fmt=args.dump_format, compress=args.gzip, jobs=args.jobs,
+                          name_aliases=args.name_aliases)
     else:
-        migrator = DataMigrator(use_supabase=not args.direct)
-        migrator.run_migration()
+        sink = "memory" if args.dry_run else args.sink
+        migrator = DataMigrator(use_supabase=not args.direct, stream=args.stream,
+                                in_flight=args.in_flight, concurrency=args.concurrency,
+                                batch_rows=batch_rows, batch_bytes=batch_bytes,
+                                sink=sink, sink_path=args.sink_path,
+                                transform_workers=args.transform_workers, fast_load=args.fast_load,
+                                push_down=args.push_down, verify_push_down=args.verify_push_down,
+                                loaders=args.pipeline, name_aliases=args.name_aliases,
+                                partitions=args.partitions)
+        migrator.metrics.progress = args.progress
+        migrator.run_migration(jobs=args.jobs, checkpoint_path=args.checkpoint, resume=args.resume,
+                               report_path=args.report, dead_letter_path=args.dead_letter,
+                               sync=args.sync, sync_state_path=args.sync_state)
@@ -0,0 +1,33 @@
+-- Bulk username resolution for migrate_data.py (Supabase mode)
+-- Resolves every username in one call: usernames already on a users row keep
+-- that row's id, and a row whose id the migration derived for a username (an
+-- email user's Name) gains that username if it has none. Nothing is inserted
+-- (users need an email), so usernames matching no row are left out.
+-- Returns a single {username: id} JSON object so PostgREST's row limit
+-- doesn't truncate large maps. Keep in sync with RESOLVE_USERNAMES_SQL.
+
+CREATE OR REPLACE FUNCTION resolve_usernames(usernames TEXT[], ids UUID[])
+RETURNS JSONB
+LANGUAGE sql
+AS $$
+    WITH input AS (
+        SELECT * FROM unnest(usernames, ids) AS t(username, id)
+    ),
+    existing AS (
+        SELECT u.username, u.id FROM users u JOIN input i ON i.username = u.username
+    ),
+    by_id AS (
+        SELECT i.username, u.id FROM users u JOIN input i ON i.id = u.id
+        WHERE NOT EXISTS (SELECT 1 FROM existing e WHERE e.username = i.username)
+    ),
+    named AS (
+        UPDATE users u SET username = b.username FROM by_id b
+        WHERE u.id = b.id AND u.username IS NULL
+    )
+    SELECT COALESCE(jsonb_object_agg(resolved.username, resolved.id), '{}'::jsonb)
+    FROM (
+        SELECT username, id FROM existing
+        UNION ALL
+        SELECT username, id FROM by_id
+    ) AS resolved;
+$$;